@@ -1,544 +1,751 @@
-from abc import ABC, abstractmethod
-from string import ascii_uppercase
-from flask import Flask, jsonify, abort, make_response, request
+import threading
+import time
+import zlib
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    abort,
+    g,
+    make_response,
+    request,
+    stream_with_context,
+)
+from werkzeug.exceptions import default_exceptions
+from core import (
+    FIGURE_CODES,
+    Bishop,
+    Board,
+    King,
+    Knight,
+    Pawn,
+    Queen,
+    Rook,
+    analyze_board,
+    board_figure,
+    decode_board,
+    encode_board,
+    load_position,
+    ndjson_lines,
+    placements_board,
+    replay_moves,
+    run_query,
+    wrong_figure_template,
+)
+from fen import MoveCache, parse_fen, zobrist_hash
+from metrics import CONTENT_TYPE, Registry
+from profiling import PROFILERS, write_dump
+from sessions import GameStore
+from solver import shortest_path
+from squares import FIELDS, FIELD_INDEX
+
+MAX_BATCH_SIZE = 1000
+MAX_GAMES = 10000
+GAME_TTL = 3600
+FEN_CACHE_SIZE = 100000
+# Serialize every check and validate response of the served board at startup.
+WARM_RESPONSE_CACHE = False
+# Lets a reverse proxy store check and validate responses. Raise max-age to
+# let it answer without revalidating, at the cost of serving a stale position
+# for that long after a move.
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# Lets a single /api/v1/... request ask to be profiled with ?profile=trace or
+# ?profile=sample, or an X-Profile header. A profiled request is many times
+# slower, so keep this off unless a slowdown is being looked into.
+PROFILING = False
+# Profiles written with profile_output=dump go here; only the newest
+# PROFILE_DUMPS are kept.
+PROFILE_DIR = "profiles"
+PROFILE_DUMPS = 100
+PROFILE_TOP_FRAMES = 25
+PROFILE_OUTPUTS = ("top", "collapsed", "dump")
+# The board served by the /api/v1/<figure>/... routes, set up in __main__.
+board = None
+
+
+def check_message(piece, current_field):
+    """
+    The check_message function is used to check if the current field is equal to the current field of a figure.
+    If it is, then it returns a list of available moves for that figure. If not, then it returns an error message.
+
+    :param piece: The Figure to ask
+    :param current_field: Check if the current field is equal to the field that was sent by the user
+    :return: A list of dictionaries, which contains the available moves for the selected figure and some other information
+    :doc-author: Trelent
+    """
+    status, template = piece.check_result(current_field)
+    if status != 200:
+        abort(status, description=template)
+    return template
+
+
+def validate_message(piece, current_field, dest_field):
+    """
+    The validate_message function is used to validate the move of a figure.
+    It takes two parameters: current_field and dest_field.
+    The function checks if the destination field is occupied by another figure, if so it will return an error message.
+    If not, it will check if the move is valid or invalid and return an
+
+    :param piece: The Figure to ask
+    :param current_field: Determine the current position of the figure
+    :param dest_field: Check if the destination field is occupied by another figure
+    :return: A dictionary with the following keys:
+    :doc-author: Trelent
+    """
+    status, template = piece.validate_result(current_field, dest_field)
+    if status != 200:
+        abort(status, description=template)
+    return template
+
+
+class ResponseCache:
+    """
+    Serialized responses of one board version, keyed by the request.
+    Storing an entry for a newer board version drops all older entries.
+    """
 
-
-class Board:
     def __init__(self):
-        self.fields = [[i + str(j) for i in ascii_uppercase[:8]] for j in range(1, 9)]
-        self.occupation = {
-            i + str(j): "" for i in ascii_uppercase[:8] for j in range(1, 9)
-        }
+        # The version and its entries are swapped together as one tuple, so a
+        # reader that got the tuple never sees entries of another version.
+        self.current = (0, {})
+        self.lock = threading.Lock()
 
+    def get(self, version, key):
+        """
+        The get function returns the cached (body, status) of a request.
 
-class Figure(ABC):
-    def __init__(self, current_field):
-        if board.occupation.get(current_field) != "":
-            self.current_field = None
-        else:
-            self.current_field = current_field
-            board.occupation[current_field] = self.name
+        :param self: Access the cache
+        :param version: Current version of the board
+        :param key: Tuple of the figure and the fields of the request
+        :return: A tuple of the response bytes and status code, or None
+        """
+        current_version, entries = self.current
+        if version != current_version:
+            return None
+        return entries.get(key)
 
-    @abstractmethod
-    def list_available_moves(self):
+    def put(self, version, key, entry):
+        """
+        The put function stores the serialized response of a request.
+
+        :param self: Access the cache
+        :param version: Version of the board the response was computed on
+        :param key: Tuple of the figure and the fields of the request
+        :param entry: A tuple of the response bytes and status code
+        """
+        with self.lock:
+            if version > self.current[0]:
+                self.current = (version, {})
+            if version == self.current[0]:
+                self.current[1][key] = entry
+
+
+games = GameStore(max_games=MAX_GAMES, ttl=GAME_TTL)
+fen_cache = MoveCache(maxsize=FEN_CACHE_SIZE)
+response_cache = ResponseCache()
+
+registry = Registry()
+request_count = registry.counter(
+    "chess_requests_total",
+    "Requests answered, by route, method, figure and status code.",
+    ("route", "method", "figure", "status"),
+)
+request_latency = registry.histogram(
+    "chess_request_duration_seconds",
+    "Time from routing a request to returning its response.",
+    ("route", "figure"),
+)
+stage_latency = registry.histogram(
+    "chess_stage_duration_seconds",
+    "Time spent generating moves and serializing responses.",
+    ("stage", "figure"),
+)
+
+
+def record_request(route, method, figure, status, elapsed):
+    """
+    The record_request function counts a finished request and observes its latency.
+    Figure names that aren't figures are counted as "unknown", so clients can't add series.
+
+    :param route: The route template, e.g. "/api/v1/<figure>/<current_field>"
+    :param method: HTTP method of the request
+    :param figure: Figure name sent in the URL, or None for routes without one
+    :param status: HTTP status code of the response
+    :param elapsed: Seconds spent answering the request
+    """
+    if figure is not None and figure not in FIGURE_CODES:
+        figure = "unknown"
+    request_count.inc(route, method, figure, str(status))
+    request_latency.observe(elapsed, route, figure)
+
+
+class API:
+    app = Flask(__name__)
+
+    @staticmethod
+    @app.route("/api/v1/<figure>/<current_field>", methods=["GET"])
+    def check_available_moves(figure, current_field):
         """
-        The list_available_moves function accepts a board object as an argument and returns a list of all the possible moves that can be made on that board.
-        The function should return an empty list if there are no available moves.
+        The check_available_moves function takes a figure and the current field as arguments.
+        It returns a list of available moves for that figure on that field.
 
-        :param self: Refer to the object itself
-        :return: A list of all the possible moves that can be made by a player
+        :param figure: Determine which figure is currently being moved
+        :param current_field: Check if the move is possible
+        :return: A list of available moves for a given figure and field
         :doc-author: Trelent
         """
-        pass
+        # Read the served board once: prefork.sync_board may replace it while
+        # this request runs, and the answer must come from a single board.
+        state_board = board
+        piece = state_board.figures.get(figure)
+        if piece is None:
+            abort(404, description=wrong_figure_template())
+        return API.cached_response(
+            state_board, (figure, current_field), API.check_body, piece, current_field
+        )
 
-    @abstractmethod
-    def validate_move(self, dest_field):
+    @staticmethod
+    @app.route("/api/v1/<figure>/<current_field>/<dest_field>", methods=["GET"])
+    def validate_available_moves(figure, current_field, dest_field):
         """
-        The validate_move function checks to see if the move is valid.
-        It does this by checking if the space is empty and within bounds of the board.
-        If it passes these tests, then it returns True.
+        The validate_available_moves function is used to validate the moves of a given figure.
+        It takes two parameters: current_field and dest_field, which are both strings.
+        The function returns a JSON object with either an error message or the list of available moves.
 
-        :param self: Access the class attributes
-        :param dest_field: Check if the destination field is empty
-        :return: A boolean value
+        :param figure: Determine which figure is currently on the current_field
+        :param current_field: Get the current position of the piece
+        :param dest_field: Check if the destination field is occupied by a figure of the same color
+        :return: A json object with the following structure:
         :doc-author: Trelent
         """
-        pass
+        state_board = board
+        piece = state_board.figures.get(figure)
+        if piece is None:
+            abort(404, description=wrong_figure_template())
+        return API.cached_response(
+            state_board,
+            (figure, current_field, dest_field),
+            piece.validate_result,
+            current_field,
+            dest_field,
+        )
 
-    def find_in_nested_list(self, list, field):
-        for sub_list in list:
-            if field in sub_list:
-                return (list.index(sub_list), sub_list.index(field))
+    @staticmethod
+    def check_body(piece, current_field):
+        """
+        The check_body function returns what check_available_moves sends for a figure and field.
 
-    def check_message(self, current_field):
+        :param piece: The figure asked about
+        :param current_field: Field sent by the user
+        :return: A tuple of the status code and the object to serialize
         """
-        The check_message function is used to check if the current field is equal to the current field of a figure.
-        If it is, then it returns a list of available moves for that figure. If not, then it returns an error message.
+        status, template = piece.check_result(current_field)
+        return status, template[0] if status == 200 else template
 
-        :param self: Access the class attributes and methods
-        :param current_field: Check if the current field is equal to the field that was sent by the user
-        :return: A list of dictionaries, which contains the available moves for the selected figure and some other information
-        :doc-author: Trelent
+    @staticmethod
+    def cached_response(state_board, key, result, *args):
         """
-        if self.current_field == current_field:
-            template = [
-                {
-                    "availableMoves": self.list_available_moves(),
-                    "error": None,
-                    "figure": self.name,
-                    "currentField": self.current_field,
-                }
-            ]
-            return template
-        elif (
-            self.current_field != current_field
-            and current_field in board.occupation.keys()
-        ):
-            template = [
-                {
-                    "availableMoves": [],
-                    "error": "Wrong figure",
-                    "figure": None,
-                    "currentField": None,
-                }
-            ]
-            abort(404, description=template)
-            return jsonify(template)
-        elif (
-            self.current_field != current_field
-            and current_field not in board.occupation.keys()
-        ):
-            template = [
-                {
-                    "availableMoves": [],
-                    "error": "Field doesn't exist",
-                    "figure": None,
-                    "currentField": None,
-                }
-            ]
-            abort(409, description=template)
-            return jsonify(template)
+        The cached_response function answers a request on the served board from the response cache.
+        Successful responses carry an ETag, and a request whose If-None-Match lists it gets an empty 304.
+
+        :param state_board: The served board, as read once by the route
+        :param key: Tuple of the figure and the fields of the request
+        :param result: Function returning the status code and the object to serialize
+        :param args: Arguments passed to result
+        :return: A Response with the serialized body
+        """
+        body, status, etag = API.cached_entry(state_board, key, result, *args)
+        if etag is None:
+            return Response(body, status=status, mimetype=API.app.json.mimetype)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if request.if_none_match.contains_weak(etag[1:-1]):
+            return Response(status=304, headers=headers)
+        return Response(
+            body, status=status, headers=headers, mimetype=API.app.json.mimetype
+        )
 
-    def validate_message(self, current_field, dest_field):
+    @staticmethod
+    def cached_entry(state_board, key, result, *args):
+        """
+        The cached_entry function returns the serialized response of a request from the response cache.
+        On a miss the result is computed under the board lock, serialized the way the route and its error
+        handlers would, and stored for the current board version. Only requests naming real fields are
+        cached, so the cache can't grow past every figure, field and destination of the board.
+        The version, lock and Zobrist key all come from state_board, the board the result is computed on,
+        so an entry is never stored under the version of a board that replaced it in the meantime.
+
+        :param state_board: The served board the result is computed on
+        :param key: Tuple of the figure and the fields of the request
+        :param result: Function returning the status code and the object to serialize
+        :param args: Arguments passed to result
+        :return: A tuple of the response bytes, the status code and the quoted ETag (None for errors)
         """
-        The validate_message function is used to validate the move of a figure.
-        It takes two parameters: current_field and dest_field.
-        The function checks if the destination field is occupied by another figure, if so it will return an error message.
-        If not, it will check if the move is valid or invalid and return an
+        # A profiled request is always computed, or there'd be nothing to see.
+        entry = None if "profile" in g else response_cache.get(state_board.version, key)
+        if entry is None:
+            with state_board.lock:
+                version = state_board.version
+                position = state_board.key
+                with stage_latency.time("moves", key[0]):
+                    status, body = result(*args)
+            etag = None
+            if status == 200:
+                # The Zobrist key of the position and the query fully determine
+                # the body, so ETags stay valid across restarts and workers.
+                query = zlib.crc32("/".join(key).encode())
+                etag = f'"{position:016x}-{query:08x}"'
+            else:
+                body = str(default_exceptions[status](description=body))
+            with stage_latency.time("serialize", key[0]):
+                entry = jsonify(body).get_data(), status, etag
+            if all(field in FIELD_INDEX for field in key[1:]):
+                response_cache.put(version, key, entry)
+        return entry
 
-        :param self: Access the class attributes and methods
-        :param current_field: Determine the current position of the figure
-        :param dest_field: Check if the destination field is occupied by another figure
-        :return: A dictionary with the following keys:
-        :doc-author: Trelent
+    @staticmethod
+    def warm_response_cache():
         """
-        move, error = self.validate_move(dest_field)
-        if move == "valid":
-            template = [
-                {
-                    "move": move,
-                    "figure": self.name,
-                    "error": error,
-                    "currentField": current_field,
-                    "destField": dest_field,
-                }
-            ]
-            return template
-        elif move == "invalid" and dest_field not in board.occupation.keys():
-            template = [
-                {
-                    "move": move,
-                    "figure": self.name,
-                    "error": error,
-                    "currentField": current_field,
-                    "destField": dest_field,
-                }
-            ]
-            abort(404, description=template)
-            return jsonify(template)
-        elif move == "invalid" and dest_field in board.occupation.keys():
-            template = [
-                {
-                    "move": move,
-                    "figure": self.name,
-                    "error": error,
-                    "currentField": current_field,
-                    "destField": dest_field,
-                }
-            ]
-            abort(409, description=template)
-            return jsonify(template)
-
-
-class King(Figure):
-    name = "king"
-
-    def __init__(self, current_field):
-        super().__init__(current_field)
-
-    def list_available_moves(self):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        possible_moves = []
-        for dir in directions:
-            for m in (-1, 1):
-                d = (dir[0] * m, dir[1] * m)
-                row = current_index[0] + d[0]
-                col = current_index[1] + d[1]
-                if -1 < row < 8 and 8 > col > -1:
-                    possible_moves.append(board.fields[row][col])
-        return possible_moves
-
-    def validate_move(self, dest_field):
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            return "valid", None
-        else:
-            return "invalid", "Current move is not permitted"
-
-
-class Queen(Figure):
-    name = "queen"
-
-    def __init__(self, current_field):
-        super().__init__(current_field)
-
-    def list_available_moves(self):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        possible_moves = []
-        for dir in directions:
-            for m in (-1, 1):
-                d = (dir[0] * m, dir[1] * m)
-                for i in range(1, 9):
-                    row = current_index[0] + d[0] * i
-                    col = current_index[1] + d[1] * i
-                    if -1 < row < 8 and 8 > col > -1:
-                        possible_moves.append(board.fields[row][col])
-        return possible_moves
-
-    def validate_move(self, dest_field):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        dest_index = self.find_in_nested_list(board.fields, dest_field)
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
-            if diff[0] > 0 and diff[1] == 0:
-                for i in range(diff[0]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1]]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0 and diff[1] == 0:
-                for i in range(0, diff[0], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1]]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] == 0 and diff[1] > 0:
-                for i in range(diff[1]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0]][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] == 0 and diff[1] < 0:
-                for i in range(0, diff[1], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0]][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] > 0 and diff[1] > 0:
-                for i in range(diff[0]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0 and diff[1] > 0:
-                for i in range(0, diff[0], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] > 0 and diff[1] < 0:
-                for i in range(diff[1]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0 and diff[1] < 0:
-                for i in range(0, diff[1], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            return "valid", None
-        else:
-            return "invalid", "Current move is not permitted"
-
-
-class Rook(Figure):
-    name = "rook"
-
-    def __init__(self, current_field):
-        super().__init__(current_field)
-
-    def list_available_moves(self):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        directions = [(1, 0), (0, 1)]
-        possible_moves = []
-        for dir in directions:
-            for m in (-1, 1):
-                d = (dir[0] * m, dir[1] * m)
-                for i in range(1, 9):
-                    row = current_index[0] + d[0] * i
-                    col = current_index[1] + d[1] * i
-                    if -1 < row < 8 and 8 > col > -1:
-                        possible_moves.append(board.fields[row][col])
-        return possible_moves
-
-    def validate_move(self, dest_field):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        dest_index = self.find_in_nested_list(board.fields, dest_field)
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
-            if diff[0] > 0:
-                for i in range(diff[0]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1]]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0:
-                for i in range(0, diff[0], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1]]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            if diff[1] > 0:
-                for i in range(diff[1]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0]][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[1] < 0:
-                for i in range(0, diff[1], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0]][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            return "valid", None
-        else:
-            return "invalid", "Current move is not permitted"
-
-
-class Bishop(Figure):
-    name = "bishop"
-
-    def __init__(self, current_field):
-        super().__init__(current_field)
-
-    def list_available_moves(self):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        directions = [(1, 1), (1, -1)]
-        possible_moves = []
-        for dir in directions:
-            for m in (-1, 1):
-                d = (dir[0] * m, dir[1] * m)
-                for i in range(1, 9):
-                    row = current_index[0] + d[0] * i
-                    col = current_index[1] + d[1] * i
-                    if -1 < row < 8 and 8 > col > -1:
-                        possible_moves.append(board.fields[row][col])
-        return possible_moves
-
-    def validate_move(self, dest_field):
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        dest_index = self.find_in_nested_list(board.fields, dest_field)
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
-            if diff[0] > 0 and diff[1] > 0:
-                for i in range(diff[0]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0 and diff[1] > 0:
-                for i in range(0, diff[0], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] > 0 and diff[1] < 0:
-                for i in range(diff[1]):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
-                        )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            elif diff[0] < 0 and diff[1] < 0:
-                for i in range(0, diff[1], -1):
-                    if (
-                        board.occupation.get(
-                            board.fields[dest_index[0] - i][dest_index[1] - i]
+        The warm_response_cache function serializes every check and validate response of the served board.
+        """
+        state_board = board
+        with API.app.app_context():
+            for name, piece in state_board.figures.items():
+                for field in FIELDS:
+                    API.cached_entry(
+                        state_board, (name, field), API.check_body, piece, field
+                    )
+                    for dest_field in FIELDS:
+                        API.cached_entry(
+                            state_board,
+                            (name, field, dest_field),
+                            piece.validate_result,
+                            field,
+                            dest_field,
                         )
-                        != ""
-                    ):
-                        return "invalid", "Current move is not permitted"
-            return "valid", None
-        else:
-            return "invalid", "Current move is not permitted"
 
+    @staticmethod
+    @app.route("/api/v1/analysis", methods=["GET"])
+    def analyze_position():
+        """
+        The analyze_position function sums up the mobility and attacks of every figure on the served board in one response.
+        It replaces asking check_available_moves about every figure, see core.analyze_board.
+
+        :return: A json object with the figure summaries, totals, heatmaps, contested fields and undefended figures
+        """
+        state_board = board
+        return API.cached_response(
+            state_board, ("analysis",), API.analysis_body, state_board
+        )
 
-class Knight(Figure):
-    name = "knight"
+    @staticmethod
+    def analysis_body(state_board):
+        """
+        The analysis_body function returns what analyze_position sends for a board.
 
-    def __init__(self, current_field):
-        super().__init__(current_field)
+        :param state_board: The board to analyze
+        :return: A tuple of the status code and the object to serialize
+        """
+        return 200, analyze_board(state_board)
 
-    def list_available_moves(self):
-        directions = [
-            (-2, 1),
-            (-1, 2),
-            (1, 2),
-            (2, 1),
-            (-2, -1),
-            (-1, -2),
-            (1, -2),
-            (2, -1),
-        ]
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        possible_moves = []
-        for dir in directions:
-            # for m in (-1, 1):
-            d = (dir[0], dir[1])
-            row = current_index[0] + d[0]
-            col = current_index[1] + d[1]
-            if -1 < row < 8 and 8 > col > -1:
-                possible_moves.append(board.fields[row][col])
-        return possible_moves
-
-    def validate_move(self, dest_field):
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            return "valid", None
-        else:
-            print("Field already taken")
-            return "invalid", "Current move is not permitted"
-
-
-class Pawn(Figure):
-    name = "pawn"
-
-    def __init__(self, current_field):
-        super().__init__(current_field)
-
-    def list_available_moves(self):
-        d = (1, 0)
-        current_index = self.find_in_nested_list(board.fields, self.current_field)
-        row = current_index[0] + d[0]
-        col = current_index[1] + d[1]
-        if -1 < row < 8 and 8 > col > -1:
-            return board.fields[row][col]
-
-    def validate_move(self, dest_field):
-        if (
-            board.occupation.get(dest_field) == ""
-            and dest_field in self.list_available_moves()
-        ):
-            return "valid", None
+    @staticmethod
+    @app.route("/api/v1/batch", methods=["POST"])
+    def batch_moves():
+        """
+        The batch_moves function answers a JSON array of check and validate queries in one request.
+        Every query is evaluated against the same board snapshot, and errors are reported per query
+        instead of aborting the whole request.
+
+        :return: A json array with the status code and the check_message or validate_message template of every query
+        """
+        queries = request.get_json(silent=True)
+        if not isinstance(queries, list):
+            abort(400, description="Expected a JSON array of queries")
+        if len(queries) > MAX_BATCH_SIZE:
+            abort(400, description=f"A batch can hold at most {MAX_BATCH_SIZE} queries")
+        state_board = board
+        with state_board.lock, stage_latency.time("moves", None):
+            results = [API.run_query(query, state_board) for query in queries]
+        with stage_latency.time("serialize", None):
+            return jsonify(results)
+
+    @staticmethod
+    def run_query(query, state_board):
+        """
+        The run_query function evaluates a single batch query against the served board, see core.run_query.
+
+        :param query: A dictionary with the figure, currentField and optional destField keys
+        :param state_board: The served board, as read once by the batch
+        :return: A dictionary with the status code and the response template of the query
+        """
+        # The batch answers like the single check and validate routes, which
+        # ask the first figure of a kind whatever its field.
+        return run_query(query, state_board, by_field=False)
+
+    @staticmethod
+    @app.route("/api/v1/stream", methods=["POST"])
+    def stream_moves():
+        """
+        The stream_moves function replays a move list sent as the request body and streams back one NDJSON verdict per line.
+        The body is read and answered line by line (see replay_moves), so its size doesn't matter.
+        The moves are played on a copy of the served board, or on the position of the fen query parameter.
+
+        :return: A streamed application/x-ndjson response
+        """
+        if "fen" in request.args:
+            try:
+                position = load_position(request.args["fen"])
+            except ValueError as e:
+                abort(400, description=str(e))
         else:
-            return "invalid", "Current move is not permitted"
+            state_board = board
+            with state_board.lock:
+                position = decode_board(encode_board(state_board))
+        lines = (line.decode("utf-8", "replace") for line in request.stream)
+        return Response(
+            stream_with_context(ndjson_lines(replay_moves(lines, position))),
+            mimetype="application/x-ndjson",
+        )
 
+    @staticmethod
+    @app.route("/api/v1/games", methods=["POST"])
+    def create_game():
+        """
+        The create_game function starts a new game from a JSON body like {"figures": [{"figure": "king", "field": "D5"}]}.
 
-class API:
-    app = Flask(__name__)
+        :return: A json object with the gameId to use in the /api/v1/games/<game_id>/... routes
+        """
+        body = request.get_json(silent=True)
+        placements = body.get("figures") if isinstance(body, dict) else None
+        if not isinstance(placements, list):
+            abort(400, description="Expected a JSON object with a figures array")
+        state = bytearray(64)
+        for placement in placements:
+            if (
+                not isinstance(placement, dict)
+                or not isinstance(placement.get("figure"), str)
+                or not isinstance(placement.get("field"), str)
+                or placement["figure"] not in FIGURE_CODES
+                or placement["field"] not in FIELD_INDEX
+            ):
+                abort(400, description="Malformed figure placement")
+            square = FIELD_INDEX[placement["field"]]
+            if state[square]:
+                abort(400, description=f"Field {placement['field']} already taken")
+            state[square] = FIGURE_CODES[placement["figure"]]
+        return jsonify({"gameId": games.create(bytes(state))}), 201
 
     @staticmethod
-    @app.route("/api/v1/<figure>/<current_field>", methods=["GET"])
-    def check_available_moves(figure, current_field):
+    @app.route("/api/v1/games/<game_id>", methods=["DELETE"])
+    def delete_game(game_id):
         """
-        The check_available_moves function takes a figure and the current field as arguments.
-        It returns a list of available moves for that figure on that field.
+        The delete_game function ends a game and frees its state.
 
+        :param game_id: ID returned by create_game
+        :return: An empty 204 response
+        """
+        if not games.delete(game_id):
+            abort(404, description="Game not found")
+        return "", 204
+
+    @staticmethod
+    @app.route("/api/v1/games/<game_id>/<figure>/<current_field>", methods=["GET"])
+    def check_game_moves(game_id, figure, current_field):
+        """
+        The check_game_moves function answers check_available_moves for the board of a single game.
+
+        :param game_id: ID returned by create_game
         :param figure: Determine which figure is currently being moved
         :param current_field: Check if the move is possible
         :return: A list of available moves for a given figure and field
-        :doc-author: Trelent
         """
-        if figure == "king":
-            return jsonify(king.check_message(current_field)[0])
-        elif figure == "queen":
-            return jsonify(queen.check_message(current_field)[0])
-        elif figure == "rook":
-            return jsonify(rook.check_message(current_field)[0])
-        elif figure == "bishop":
-            return jsonify(bishop.check_message(current_field)[0])
-        elif figure == "knight":
-            return jsonify(knight.check_message(current_field)[0])
-        elif figure == "pawn":
-            return jsonify(pawn.check_message(current_field)[0])
+        piece = API.game_figure(game_id, figure, current_field)
+        return jsonify(check_message(piece, current_field)[0])
 
     @staticmethod
-    @app.route("/api/v1/<figure>/<current_field>/<dest_field>", methods=["GET"])
-    def validate_available_moves(figure, current_field, dest_field):
+    @app.route(
+        "/api/v1/games/<game_id>/<figure>/<current_field>/<dest_field>",
+        methods=["GET"],
+    )
+    def validate_game_moves(game_id, figure, current_field, dest_field):
         """
-        The validate_available_moves function is used to validate the moves of a given figure.
-        It takes two parameters: current_field and dest_field, which are both strings.
-        The function returns a JSON object with either an error message or the list of available moves.
+        The validate_game_moves function answers validate_available_moves for the board of a single game.
 
+        :param game_id: ID returned by create_game
         :param figure: Determine which figure is currently on the current_field
         :param current_field: Get the current position of the piece
-        :param dest_field: Check if the destination field is occupied by a figure of the same color
-        :return: A json object with the following structure:
-        :doc-author: Trelent
+        :param dest_field: Check if the destination field is free and reachable
+        :return: A json object with the validation result
         """
-        if figure == "king":
-            return jsonify(king.validate_message(current_field, dest_field))
-        elif figure == "queen":
-            return jsonify(queen.validate_message(current_field, dest_field))
-        elif figure == "rook":
-            return jsonify(rook.validate_message(current_field, dest_field))
-        elif figure == "bishop":
-            return jsonify(bishop.validate_message(current_field, dest_field))
-        elif figure == "knight":
-            return jsonify(knight.validate_message(current_field, dest_field))
-        elif figure == "pawn":
-            return jsonify(pawn.validate_message(current_field, dest_field))
+        piece = API.game_figure(game_id, figure, current_field)
+        return jsonify(validate_message(piece, current_field, dest_field))
+
+    @staticmethod
+    def game_figure(game_id, figure, current_field):
+        """
+        The game_figure function finds the figure a game route is asking about, see board_figure.
+
+        :param game_id: ID returned by create_game
+        :param figure: Name of the figure
+        :param current_field: Field sent by the user
+        :return: The Figure instance on the game board
+        """
+        state = games.get(game_id)
+        if state is None:
+            abort(404, description="Game not found")
+        piece = board_figure(decode_board(state), figure, current_field)
+        if piece is None:
+            abort(404, description=wrong_figure_template())
+        return piece
+
+    @staticmethod
+    @app.route("/api/v1/fen/<figure>/<current_field>", methods=["GET"])
+    def check_fen_moves(figure, current_field):
+        """
+        The check_fen_moves function answers check_available_moves for the position in the fen query parameter.
+        Results are cached by the Zobrist hash of the position, so repeated queries skip move generation.
+
+        :param figure: Determine which figure is currently being moved
+        :param current_field: Check if the move is possible
+        :return: A list of available moves for a given figure and field
+        """
+        placements, key = API.fen_position()
+        result = fen_cache.get((key, figure, current_field))
+        if result is None:
+            piece = board_figure(placements_board(placements), figure, current_field)
+            if piece is None:
+                result = 404, wrong_figure_template()
+            else:
+                result = piece.check_result(current_field)
+            fen_cache.put((key, figure, current_field), result)
+        status, template = result
+        if status != 200:
+            abort(status, description=template)
+        return jsonify(template[0])
+
+    @staticmethod
+    @app.route("/api/v1/fen/<figure>/<current_field>/<dest_field>", methods=["GET"])
+    def validate_fen_moves(figure, current_field, dest_field):
+        """
+        The validate_fen_moves function answers validate_available_moves for the position in the fen query parameter.
+
+        :param figure: Determine which figure is currently on the current_field
+        :param current_field: Get the current position of the piece
+        :param dest_field: Check if the destination field is free and reachable
+        :return: A json object with the validation result
+        """
+        placements, key = API.fen_position()
+        result = fen_cache.get((key, figure, current_field, dest_field))
+        if result is None:
+            piece = board_figure(placements_board(placements), figure, current_field)
+            if piece is None:
+                result = 404, wrong_figure_template()
+            else:
+                result = piece.validate_result(current_field, dest_field)
+            fen_cache.put((key, figure, current_field, dest_field), result)
+        status, template = result
+        if status != 200:
+            abort(status, description=template)
+        return jsonify(template)
+
+    @staticmethod
+    @app.route("/api/v1/fen/analysis", methods=["GET"])
+    def analyze_fen_position():
+        """
+        The analyze_fen_position function answers analyze_position for the position in the fen query parameter.
+        Results are cached by the Zobrist hash of the position, like the other FEN routes.
+
+        :return: A json object with the figure summaries, totals, heatmaps, contested fields and undefended figures
+        """
+        placements, key = API.fen_position()
+        result = fen_cache.get((key, "analysis"))
+        if result is None:
+            result = API.analysis_body(placements_board(placements))
+            fen_cache.put((key, "analysis"), result)
+        return jsonify(result[1])
+
+    @staticmethod
+    @app.route("/api/v1/fen/cache", methods=["GET"])
+    def fen_cache_stats():
+        """
+        The fen_cache_stats function reports the hit and miss counters of the FEN move cache.
+
+        :return: A json object with the hits, misses, size and maxsize of the cache
+        """
+        return jsonify(fen_cache.stats())
+
+    @staticmethod
+    @app.route("/api/v1/path/<figure>/<current_field>/<dest_field>", methods=["GET"])
+    def find_path(figure, current_field, dest_field):
+        """
+        The find_path function answers the minimum number of moves a figure needs from current_field to dest_field.
+        Other figures on the board block the way; pass ?board=empty to ask about an empty board instead.
+
+        :param figure: Name of the figure to route
+        :param current_field: Field the figure starts on
+        :param dest_field: Field the figure has to reach
+        :return: A json object with the number of moves and one shortest path
+        """
+        template = [
+            {
+                "moves": None,
+                "path": [],
+                "error": None,
+                "figure": figure,
+                "currentField": current_field,
+                "destField": dest_field,
+            }
+        ]
+        if figure not in FIGURE_CODES:
+            template[0]["error"] = "Wrong figure"
+            abort(404, description=template)
+        if current_field not in FIELD_INDEX or dest_field not in FIELD_INDEX:
+            template[0]["error"] = "Field doesn't exist"
+            abort(409, description=template)
+        occupied = 0 if request.args.get("board") == "empty" else board.occupied
+        path = shortest_path(
+            figure, FIELD_INDEX[current_field], FIELD_INDEX[dest_field], occupied
+        )
+        if path is None:
+            template[0]["error"] = "Destination can't be reached"
+            abort(409, description=template)
+        template[0]["moves"] = len(path) - 1
+        template[0]["path"] = [FIELDS[index] for index in path]
+        return jsonify(template[0])
+
+    @staticmethod
+    def fen_position():
+        """
+        The fen_position function reads the fen query parameter of the current request.
+
+        :return: A tuple of the parsed placements and their Zobrist hash
+        """
+        try:
+            placements = parse_fen(request.args.get("fen", ""))
+        except ValueError as e:
+            abort(400, description=str(e))
+        return placements, zobrist_hash(placements)
+
+    @staticmethod
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """
+        The metrics function exposes the request counters and latency histograms for Prometheus.
+
+        :return: The metrics in the Prometheus text exposition format
+        """
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    @staticmethod
+    @app.before_request
+    def start_timer():
+        """
+        The start_timer function notes when the app started handling a request.
+        """
+        g.request_start = time.perf_counter()
+
+    @staticmethod
+    @app.after_request
+    def record_metrics(response):
+        """
+        The record_metrics function records every answered request, error responses included.
+        Streamed responses are timed until the response is returned, not until the stream ends.
+        Profiled requests are counted with the status of the route's response, not of the profile report.
+
+        :param response: The response about to be sent
+        :return: The same response
+        """
+        # finish_profiler was registered later, so it has already run and may
+        # have replaced the response with the report.
+        status = g.pop("profiled_status", response.status_code)
+        start = g.pop("request_start", None)
+        if start is not None:
+            rule = request.url_rule
+            record_request(
+                rule.rule if rule is not None else "unmatched",
+                request.method,
+                (request.view_args or {}).get("figure"),
+                status,
+                time.perf_counter() - start,
+            )
+        return response
+
+    @staticmethod
+    @app.before_request
+    def start_profiler():
+        """
+        The start_profiler function starts profiling an /api/v1/ request that asks for it, if PROFILING is on.
+        The profile query parameter or X-Profile header picks the profiler, "trace" or "sample", and the
+        profile_output query parameter or X-Profile-Output header picks one of PROFILE_OUTPUTS.
+        """
+        if not PROFILING or not request.path.startswith("/api/v1/"):
+            return
+        mode = request.args.get("profile", request.headers.get("X-Profile"))
+        if mode is None:
+            return
+        output = request.args.get(
+            "profile_output", request.headers.get("X-Profile-Output", "top")
+        )
+        if mode not in PROFILERS or output not in PROFILE_OUTPUTS:
+            abort(400, description="Unknown profiler or profile output")
+        g.profile = PROFILERS[mode](), mode, output
+        g.profile[0].start()
+
+    @staticmethod
+    @app.after_request
+    def finish_profiler(response):
+        """
+        The finish_profiler function stops the profiler of a profiled request and reports what it found.
+        The top output replaces the response with the hottest frames, collapsed replaces it with the
+        collapsed stacks for a flamegraph, and dump writes both to PROFILE_DIR and keeps the response.
+        Streamed responses are profiled until the response is returned, not until the stream ends.
+
+        :param response: The response of the request
+        :return: The response to send
+        """
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        profiler, mode, output = profile
+        profiler.stop()
+        g.profiled_status = response.status_code
+        if output == "dump":
+            figure = (request.view_args or {}).get("figure")
+            response.headers["X-Profile-Dump"] = write_dump(
+                PROFILE_DIR,
+                figure if figure in FIGURE_CODES else "request",
+                profiler,
+                {
+                    "path": request.full_path,
+                    "mode": mode,
+                    "status": response.status_code,
+                },
+                keep=PROFILE_DUMPS,
+                limit=PROFILE_TOP_FRAMES,
+            )
+            return response
+        if output == "collapsed":
+            report = Response(profiler.collapsed(), mimetype="text/plain")
+        else:
+            report = jsonify(
+                {
+                    "mode": mode,
+                    "status": response.status_code,
+                    "frames": profiler.top_frames(PROFILE_TOP_FRAMES),
+                }
+            )
+        report.headers["X-Profile-Status"] = str(response.status_code)
+        return report
+
+    @staticmethod
+    @app.errorhandler(400)
+    def bad_request(e):
+        """
+        The bad_request function is called when the request body can't be used, e.g. a batch that isn't a JSON array.
+
+        :param e: The exception raised by abort
+        :return: A 400 error message
+        """
+        return jsonify(str(e)), 400
 
     @staticmethod
     @app.errorhandler(404)
@@ -571,18 +778,34 @@ class API:
         return jsonify(str(e)), 409
 
 
-if __name__ == "__main__":
+def setup_demo_board():
+    """
+    The setup_demo_board function makes a new board with the demo position the served routes answer for.
+
+    :return: The new module-level board
+    """
+    global board
     board = Board()
-    pawn = Pawn("C5")
-    pawn2 = Pawn("C4")
-    pawn3 = Pawn("C3")
-    pawn4 = Pawn("F6")
-    pawn5 = Pawn("E4")
-    pawn6 = Pawn("E3")
-    king = King("D5")
-    queen = Queen("D7")
-    bishop = Bishop("D3")
-    knight = Knight("C2")
-    rook = Rook("F4")
+    for figure, field in (
+        (Pawn, "C5"),
+        (Pawn, "C4"),
+        (Pawn, "C3"),
+        (Pawn, "F6"),
+        (Pawn, "E4"),
+        (Pawn, "E3"),
+        (King, "D5"),
+        (Queen, "D7"),
+        (Bishop, "D3"),
+        (Knight, "C2"),
+        (Rook, "F4"),
+    ):
+        figure(FIELD_INDEX[field], board)
+    return board
+
+
+if __name__ == "__main__":
+    setup_demo_board()
     api = API()
+    if WARM_RESPONSE_CACHE:
+        api.warm_response_cache()
     api.app.run(debug=True, port=8000)
@@ -0,0 +1,235 @@
+"""
+ASGI entry point for the move API.
+
+    uvicorn asgi:application
+
+Serves the same check, validate and batch routes with the same response
+bodies as the Flask app, from the same board and response cache. Response
+cache hits are answered on the event loop; cache misses and batches are
+evaluated on a thread pool so they don't hold up the event loop.
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+from werkzeug.exceptions import default_exceptions
+from werkzeug.http import parse_etags
+
+import app as chess
+from metrics import CONTENT_TYPE
+
+EXECUTOR_WORKERS = 4
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+
+if chess.board is None:
+    chess.setup_demo_board()
+    if chess.WARM_RESPONSE_CACHE:
+        chess.API.warm_response_cache()
+
+
+def serialize(obj):
+    """
+    The serialize function encodes a response body exactly like jsonify in the Flask routes.
+
+    :param obj: The object to encode
+    :return: The response bytes
+    """
+    with chess.API.app.app_context():
+        return jsonify(obj).get_data()
+
+
+def error(status, description=None):
+    """
+    The error function builds the body the Flask error handlers send for an aborted request.
+
+    :param status: HTTP status code
+    :param description: Description passed to abort, or None for the default text
+    :return: A tuple of the status code, the headers and the response bytes
+    """
+    return status, [], serialize(str(default_exceptions[status](description)))
+
+
+async def cached(state_board, key, result, *args, if_none_match=None):
+    """
+    The cached function answers a check or validate request from the response cache, like API.cached_response.
+    Only the cache lookup runs on the event loop. A miss is computed on the executor, as it generates
+    moves and serializes under the board lock, which a batch may be holding.
+
+    :param state_board: The served board, as read once by the request
+    :param key: Tuple of the figure and the fields of the request
+    :param result: Function returning the status code and the object to serialize
+    :param args: Arguments passed to result
+    :param if_none_match: Value of the If-None-Match header, if any
+    :return: A tuple of the status code, the headers and the response bytes
+    """
+    entry = chess.response_cache.get(state_board.version, key)
+    if entry is None:
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(
+            executor, compute_entry, state_board, key, result, *args
+        )
+    body, status, etag = entry
+    if etag is None:
+        return status, [], body
+    headers = [
+        (b"etag", etag.encode()),
+        (b"cache-control", chess.CACHE_CONTROL.encode()),
+    ]
+    if if_none_match and parse_etags(if_none_match).contains_weak(etag[1:-1]):
+        return 304, headers, b""
+    return status, headers, body
+
+
+def compute_entry(state_board, key, result, *args):
+    with chess.API.app.app_context():
+        return chess.API.cached_entry(state_board, key, result, *args)
+
+
+def run_batch(body):
+    """
+    The run_batch function answers a batch request body like the /api/v1/batch route.
+
+    :param body: The raw request body
+    :return: A tuple of the status code, the headers and the response bytes
+    """
+    try:
+        queries = json.loads(body)
+    except ValueError:
+        queries = None
+    if not isinstance(queries, list):
+        return error(400, "Expected a JSON array of queries")
+    if len(queries) > chess.MAX_BATCH_SIZE:
+        return error(400, f"A batch can hold at most {chess.MAX_BATCH_SIZE} queries")
+    state_board = chess.board
+    with state_board.lock:
+        results = [chess.API.run_query(query, state_board) for query in queries]
+    return 200, [], serialize(results)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def route_labels(path):
+    """
+    The route_labels function names the Flask route a path would match, for the request metrics.
+
+    :param path: The request path
+    :return: A tuple of the route template and the figure name, or None for routes without one
+    """
+    parts = path.split("/")
+    if path == "/metrics":
+        return "/metrics", None
+    if parts[:3] != ["", "api", "v1"] or not all(parts[3:]):
+        return "unmatched", None
+    args = parts[3:]
+    if args == ["batch"]:
+        return "/api/v1/batch", None
+    if len(args) == 2:
+        return "/api/v1/<figure>/<current_field>", args[0]
+    if len(args) == 3:
+        return "/api/v1/<figure>/<current_field>/<dest_field>", args[0]
+    return "unmatched", None
+
+
+async def handle(scope, receive):
+    """
+    The handle function routes one HTTP request.
+
+    :param scope: The ASGI connection scope
+    :param receive: The ASGI receive callable
+    :return: A tuple of the status code, the headers and the response bytes
+    """
+    if scope["path"] == "/metrics":
+        return (
+            200,
+            [(b"content-type", CONTENT_TYPE.encode())],
+            chess.registry.render().encode(),
+        )
+    parts = scope["path"].split("/")
+    if parts[:3] != ["", "api", "v1"] or not all(parts[3:]):
+        return error(404)
+    args = parts[3:]
+    method = scope["method"]
+    if args == ["batch"]:
+        if method != "POST":
+            return error(405)
+        body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, run_batch, body)
+    if len(args) not in (2, 3):
+        return error(404)
+    if method not in ("GET", "HEAD"):
+        return error(405)
+    if_none_match = None
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            if_none_match = value.decode("latin-1")
+    state_board = chess.board
+    piece = state_board.figures.get(args[0])
+    if piece is None:
+        return error(404, chess.wrong_figure_template())
+    if len(args) == 2:
+        return await cached(
+            state_board,
+            tuple(args),
+            chess.API.check_body,
+            piece,
+            args[1],
+            if_none_match=if_none_match,
+        )
+    return await cached(
+        state_board,
+        tuple(args),
+        piece.validate_result,
+        args[1],
+        args[2],
+        if_none_match=if_none_match,
+    )
+
+
+async def application(scope, receive, send):
+    """
+    The application function is the ASGI callable.
+
+    :param scope: The ASGI connection scope
+    :param receive: The ASGI receive callable
+    :param send: The ASGI send callable
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    start = time.perf_counter()
+    status, headers, body = await handle(scope, receive)
+    route, figure = route_labels(scope["path"])
+    chess.record_request(
+        route, scope["method"], figure, status, time.perf_counter() - start
+    )
+    if status != 304:
+        if not any(name == b"content-type" for name, _ in headers):
+            headers.append((b"content-type", chess.API.app.json.mimetype.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send(
+        {
+            "type": "http.response.body",
+            "body": b"" if scope["method"] == "HEAD" else body,
+        }
+    )
@@ -0,0 +1,373 @@
+"""
+Compare slider move validation on the occupation dict with the shipped bitboard path.
+
+Run from the repository root:
+
+    python benchmarks/bench_bitboard.py --positions 200 --repeat 5
+
+The dict path is a verbatim copy of the Queen, Rook and Bishop classes from
+before the bitboard engine: validate_move builds list_available_moves, finds
+both fields with find_in_nested_list and walks back from the destination in
+one of eight direction branches. The bitboard path is Figure.validate_move
+from core, a bit test against the attack map its Board keeps up to date,
+on a Board with the same figures. Move generation isn't compared, as
+list_available_moves answers from the empty-board tables either way.
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from string import ascii_uppercase
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core
+from squares import FIELDS
+
+# The board the copied classes read, set for every position before timing.
+board = None
+
+
+class Board:
+    def __init__(self):
+        self.fields = [[i + str(j) for i in ascii_uppercase[:8]] for j in range(1, 9)]
+        self.occupation = {
+            i + str(j): "" for i in ascii_uppercase[:8] for j in range(1, 9)
+        }
+
+
+class Figure:
+    def __init__(self, current_field):
+        self.current_field = current_field
+
+    def find_in_nested_list(self, list, field):
+        for sub_list in list:
+            if field in sub_list:
+                return (list.index(sub_list), sub_list.index(field))
+
+
+class Queen(Figure):
+    name = "queen"
+
+    def __init__(self, current_field):
+        super().__init__(current_field)
+
+    def list_available_moves(self):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
+        possible_moves = []
+        for dir in directions:
+            for m in (-1, 1):
+                d = (dir[0] * m, dir[1] * m)
+                for i in range(1, 9):
+                    row = current_index[0] + d[0] * i
+                    col = current_index[1] + d[1] * i
+                    if -1 < row < 8 and 8 > col > -1:
+                        possible_moves.append(board.fields[row][col])
+        return possible_moves
+
+    def validate_move(self, dest_field):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        dest_index = self.find_in_nested_list(board.fields, dest_field)
+        if (
+            board.occupation.get(dest_field) == ""
+            and dest_field in self.list_available_moves()
+        ):
+            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
+            if diff[0] > 0 and diff[1] == 0:
+                for i in range(diff[0]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1]]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0 and diff[1] == 0:
+                for i in range(0, diff[0], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1]]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] == 0 and diff[1] > 0:
+                for i in range(diff[1]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0]][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] == 0 and diff[1] < 0:
+                for i in range(0, diff[1], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0]][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] > 0 and diff[1] > 0:
+                for i in range(diff[0]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0 and diff[1] > 0:
+                for i in range(0, diff[0], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] > 0 and diff[1] < 0:
+                for i in range(diff[1]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0 and diff[1] < 0:
+                for i in range(0, diff[1], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            return "valid", None
+        else:
+            return "invalid", "Current move is not permitted"
+
+
+class Rook(Figure):
+    name = "rook"
+
+    def __init__(self, current_field):
+        super().__init__(current_field)
+
+    def list_available_moves(self):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        directions = [(1, 0), (0, 1)]
+        possible_moves = []
+        for dir in directions:
+            for m in (-1, 1):
+                d = (dir[0] * m, dir[1] * m)
+                for i in range(1, 9):
+                    row = current_index[0] + d[0] * i
+                    col = current_index[1] + d[1] * i
+                    if -1 < row < 8 and 8 > col > -1:
+                        possible_moves.append(board.fields[row][col])
+        return possible_moves
+
+    def validate_move(self, dest_field):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        dest_index = self.find_in_nested_list(board.fields, dest_field)
+        if (
+            board.occupation.get(dest_field) == ""
+            and dest_field in self.list_available_moves()
+        ):
+            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
+            if diff[0] > 0:
+                for i in range(diff[0]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1]]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0:
+                for i in range(0, diff[0], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1]]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            if diff[1] > 0:
+                for i in range(diff[1]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0]][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[1] < 0:
+                for i in range(0, diff[1], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0]][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            return "valid", None
+        else:
+            return "invalid", "Current move is not permitted"
+
+
+class Bishop(Figure):
+    name = "bishop"
+
+    def __init__(self, current_field):
+        super().__init__(current_field)
+
+    def list_available_moves(self):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        directions = [(1, 1), (1, -1)]
+        possible_moves = []
+        for dir in directions:
+            for m in (-1, 1):
+                d = (dir[0] * m, dir[1] * m)
+                for i in range(1, 9):
+                    row = current_index[0] + d[0] * i
+                    col = current_index[1] + d[1] * i
+                    if -1 < row < 8 and 8 > col > -1:
+                        possible_moves.append(board.fields[row][col])
+        return possible_moves
+
+    def validate_move(self, dest_field):
+        current_index = self.find_in_nested_list(board.fields, self.current_field)
+        dest_index = self.find_in_nested_list(board.fields, dest_field)
+        if (
+            board.occupation.get(dest_field) == ""
+            and dest_field in self.list_available_moves()
+        ):
+            diff = (dest_index[0] - current_index[0], dest_index[1] - current_index[1])
+            if diff[0] > 0 and diff[1] > 0:
+                for i in range(diff[0]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0 and diff[1] > 0:
+                for i in range(0, diff[0], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] > 0 and diff[1] < 0:
+                for i in range(diff[1]):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            elif diff[0] < 0 and diff[1] < 0:
+                for i in range(0, diff[1], -1):
+                    if (
+                        board.occupation.get(
+                            board.fields[dest_index[0] - i][dest_index[1] - i]
+                        )
+                        != ""
+                    ):
+                        return "invalid", "Current move is not permitted"
+            return "valid", None
+        else:
+            return "invalid", "Current move is not permitted"
+
+
+SLIDERS = {"queen": Queen, "rook": Rook, "bishop": Bishop}
+
+
+def random_position(rng, pieces):
+    squares = rng.sample(range(64), pieces)
+    position = Board()
+    state = bytearray(64)
+    for index in squares:
+        position.occupation[FIELDS[index]] = "pawn"
+        state[index] = core.FIGURE_CODES["pawn"]
+    return squares[0], position, state
+
+
+def main():
+    global board
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=200)
+    parser.add_argument("--pieces", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    positions = [random_position(rng, args.pieces) for _ in range(args.positions)]
+    calls = args.positions * 64
+
+    for name, slider in SLIDERS.items():
+        pieces = []
+        for source, position, state in positions:
+            state = bytearray(state)
+            state[source] = core.FIGURE_CODES[name]
+            pieces.append(
+                (
+                    slider(FIELDS[source]),
+                    position,
+                    core.decode_board(state).pieces[source],
+                )
+            )
+        # The copied walks check the wrong fields on some diagonals and raise
+        # IndexError on others (a 500 from the API back then); the bitboard
+        # path fixed both, so disagreements are counted, not fatal.
+        disagree = 0
+        for piece, position, figure in pieces:
+            board = position
+            for dest in FIELDS:
+                try:
+                    valid = piece.validate_move(dest)[0]
+                except IndexError:
+                    valid = None
+                disagree += valid != figure.validate_move(dest)[0]
+
+        def run_dict_validate():
+            global board
+            for piece, position, _ in pieces:
+                board = position
+                for dest in FIELDS:
+                    try:
+                        piece.validate_move(dest)
+                    except IndexError:
+                        pass
+
+        def run_bitboard_validate():
+            for _, _, figure in pieces:
+                for dest in FIELDS:
+                    figure.validate_move(dest)
+
+        dict_time = min(timeit.repeat(run_dict_validate, number=1, repeat=args.repeat))
+        bitboard_time = min(
+            timeit.repeat(run_bitboard_validate, number=1, repeat=args.repeat)
+        )
+        print(
+            f"{name:<6} validate dict {dict_time / calls * 1e9:8.0f} ns/call  "
+            f"bitboard {bitboard_time / calls * 1e9:8.0f} ns/call  "
+            f"speedup {dict_time / bitboard_time:5.1f}x  "
+            f"disagree {disagree}/{calls}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Memory benchmark: bytes held per board and per figure for the reference positions.
+
+    python benchmarks/bench_memory.py --boards 2000
+
+Boards are built with load_position and measured with tracemalloc, so the
+numbers include the figures, attack maps, lock and every other object a
+board keeps alive. The 64-byte encode_board state kept by the game store
+is shown for comparison.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import encode_board
+from perft import REFERENCE_POSITIONS, load_position
+
+
+def measure(fen, boards):
+    # Build one board first so that lazily created module state isn't
+    # counted against the measured ones.
+    load_position(fen)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [load_position(fen) for _ in range(boards)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    figures = len(kept[0].pieces)
+    per_board = (after - before) / boards
+    return {
+        "figures": figures,
+        "board_bytes": per_board,
+        "figure_bytes": per_board / max(figures, 1),
+        "state_bytes": sys.getsizeof(encode_board(kept[0])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boards", type=int, default=2000)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, (fen, _) in REFERENCE_POSITIONS.items():
+        results[name] = result = measure(fen, args.boards)
+        print(
+            f"{name:10} {result['figures']:3} figures  "
+            f"{result['board_bytes']:8.0f} B/board  "
+            f"{result['figure_bytes']:6.0f} B/figure  "
+            f"state {result['state_bytes']} B"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
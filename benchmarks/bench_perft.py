@@ -0,0 +1,96 @@
+"""
+Perft regression benchmark: checks node counts and nodes/sec of the reference positions.
+
+Save a baseline on a known-good commit, then compare later commits against it:
+
+    python benchmarks/bench_perft.py --save-baseline
+    python benchmarks/bench_perft.py --threshold 0.25
+
+The run fails if a node count differs from the known count, or if the
+nodes/sec of any position drops more than the threshold below the baseline.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perft import REFERENCE_POSITIONS, load_position, perft
+
+BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "perft_baseline.json"
+)
+
+
+def run(name, depth, repeat, min_time):
+    fen, counts = REFERENCE_POSITIONS[name]
+    depth = min(depth, max(counts))
+    position = load_position(fen)
+    best = 0
+    for _ in range(repeat):
+        # Short trees are repeated until min_time has passed so that timer
+        # resolution and scheduling noise don't dominate the measurement.
+        total = 0
+        start = time.perf_counter()
+        while True:
+            nodes = perft(position, depth)
+            total += nodes
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, total / elapsed)
+    return {"depth": depth, "nodes": nodes, "expected": counts[depth], "nps": best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        name: run(name, args.depth, args.repeat, args.min_time)
+        for name in REFERENCE_POSITIONS
+    }
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failed = False
+    for name, result in results.items():
+        line = (
+            f"{name:<10} depth {result['depth']}  nodes {result['nodes']:>9}  "
+            f"{result['nps']:>10.0f} nps"
+        )
+        if result["nodes"] != result["expected"]:
+            line += f"  WRONG COUNT, expected {result['expected']}"
+            failed = True
+        if name in baseline and baseline[name]["depth"] == result["depth"]:
+            change = result["nps"] / baseline[name]["nps"] - 1
+            line += f"  {change:+.1%} vs baseline"
+            if change < -args.threshold:
+                line += "  REGRESSION"
+                failed = True
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+HTTP load test of the move API: throughput and p50/p95/p99 latency per server.
+
+Starts each server with the demo board on localhost, then replays a mix of
+check (/api/v1/<figure>/<field>), validate (/api/v1/<figure>/<field>/<dest>)
+and batch requests for all six figures of the demo board from many client
+threads, each with its own keep-alive connection. Validate requests are split
+into moves the figure can make and moves it can't:
+
+    python benchmarks/loadtest.py --threads 16 --duration 10 --mix check=2,valid=1,invalid=1
+    python benchmarks/loadtest.py --servers flask,asgi --threads 64
+
+The flask server is the Flask development server, asgi is asgi.py run with
+uvicorn, which has to be installed. Pass --url to load a server that is
+already running instead, e.g. prefork.py.
+
+Save a baseline on a known-good commit, then compare later commits against it:
+
+    python benchmarks/loadtest.py --save-baseline
+    python benchmarks/loadtest.py --threshold 0.25
+
+The run fails if a request gets no response or an unexpected status code, or
+if, with the same threads and mix as the baseline, the throughput of a server
+drops or its p99 latency rises more than the threshold.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import setup_demo_board
+from squares import FIELDS
+
+BASELINE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "loadtest_baseline.json"
+)
+SERVERS = {
+    "flask": [
+        sys.executable,
+        "-c",
+        "import app; app.setup_demo_board(); app.API.app.run(port={port}, threaded=True)",
+    ],
+    "asgi": [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "asgi:application",
+        "--port",
+        "{port}",
+        "--log-level",
+        "warning",
+    ],
+}
+# Status code every kind of request is expected to get.
+EXPECTED_STATUS = {"check": 200, "valid": 200, "invalid": 409, "batch": 200}
+BATCH = json.dumps(
+    [
+        {"figure": "queen", "currentField": "D7", "destField": "A4"},
+        {"figure": "rook", "currentField": "F4"},
+        {"figure": "knight", "currentField": "C2", "destField": "E1"},
+    ]
+    * 10
+).encode()
+
+
+def demo_requests():
+    """
+    The demo_requests function lists the requests the load test picks from, for every figure kind of the demo board.
+
+    :return: A dictionary of request kind to a list of (figure, method, path, body) tuples
+    """
+    requests = {kind: [] for kind in EXPECTED_STATUS}
+    # The move routes answer for the first figure of every kind, so those
+    # are the six figures asked about.
+    for piece in setup_demo_board().figures.values():
+        prefix = f"/api/v1/{piece.name}/{piece.current_field}"
+        moves = [FIELDS[index] for index in piece.move_squares()]
+        requests["check"].append((piece.name, "GET", prefix, None))
+        requests["valid"].extend(
+            (piece.name, "GET", f"{prefix}/{dest}", None) for dest in moves
+        )
+        requests["invalid"].extend(
+            (piece.name, "GET", f"{prefix}/{dest}", None)
+            for dest in FIELDS
+            if dest not in moves
+        )
+    requests["batch"].append((None, "POST", "/api/v1/batch", BATCH))
+    return requests
+
+
+def parse_mix(text):
+    """
+    The parse_mix function reads the --mix option.
+
+    :param text: Comma separated kind=weight pairs, e.g. "check=2,valid=1,invalid=1"
+    :return: A dictionary of request kind to weight
+    :raises ValueError: If a kind is unknown or a weight isn't a non-negative number
+    """
+    mix = {}
+    for pair in text.split(","):
+        kind, _, weight = pair.partition("=")
+        kind = kind.strip()
+        if kind not in EXPECTED_STATUS:
+            raise ValueError(f"unknown request kind {kind!r}")
+        mix[kind] = float(weight or 1)
+        if mix[kind] < 0:
+            raise ValueError(f"negative weight for {kind!r}")
+    if not any(mix.values()):
+        raise ValueError("the mix needs a positive weight")
+    return mix
+
+
+def client(host, port, deadline, rng, mix, requests, samples, errors):
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            figure, method, path, body = rng.choice(requests[kind])
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                errors.append((kind, figure, path, None))
+                connection.close()
+                continue
+            samples.append((kind, figure, time.perf_counter() - start))
+            if response.status != EXPECTED_STATUS[kind]:
+                errors.append((kind, figure, path, response.status))
+    finally:
+        connection.close()
+
+
+def drive(host, port, threads, duration, seed, mix, requests):
+    # list.append is atomic, so the clients share the result lists.
+    samples = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    workers = [
+        threading.Thread(
+            target=client,
+            args=(
+                host,
+                port,
+                deadline,
+                random.Random(seed + i),
+                mix,
+                requests,
+                samples,
+                errors,
+            ),
+        )
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return samples, errors, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {
+            "requests": 0,
+            "rps": 0.0,
+            "p50_ms": None,
+            "p95_ms": None,
+            "p99_ms": None,
+        }
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def wait_until_listening(host, port, timeout=15):
+    deadline = time.perf_counter() + timeout
+    while True:
+        connection = http.client.HTTPConnection(host, port, timeout=1)
+        try:
+            connection.request("GET", "/metrics")
+            connection.getresponse().read()
+            return
+        except (http.client.HTTPException, OSError):
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+        finally:
+            connection.close()
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(host, port, args, mix):
+    """
+    The run function loads a server for the warmup and then the measured duration.
+
+    :param host: Host name of the server
+    :param port: Port of the server
+    :param args: The parsed command line
+    :param mix: A dictionary of request kind to weight
+    :return: A dictionary with the totals and the results by request kind and by figure
+    """
+    requests = demo_requests()
+    wait_until_listening(host, port)
+    drive(host, port, args.threads, args.warmup, args.seed, mix, requests)
+    samples, errors, elapsed = drive(
+        host, port, args.threads, args.duration, args.seed, mix, requests
+    )
+    result = summarize([latency for _, _, latency in samples], elapsed)
+    result["errors"] = len(errors)
+    result["error_samples"] = [
+        {"kind": kind, "figure": figure, "path": path, "status": status}
+        for kind, figure, path, status in errors[:20]
+    ]
+    for group, position in (("kinds", 0), ("figures", 1)):
+        latencies = {}
+        for sample in samples:
+            # Batches ask about several figures, so they have no figure.
+            if sample[position] is not None:
+                latencies.setdefault(sample[position], []).append(sample[2])
+        result[group] = {
+            name: summarize(values, elapsed)
+            for name, values in sorted(latencies.items())
+        }
+    return result
+
+
+def run_server(name, port, args, mix):
+    """
+    The run_server function starts one of SERVERS on localhost and loads it, see run.
+
+    :param name: Key of SERVERS
+    :param port: Port to start the server on
+    :param args: The parsed command line
+    :param mix: A dictionary of request kind to weight
+    :return: The result of run
+    """
+    command = [part.format(port=port) for part in SERVERS[name]]
+    server = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return run("127.0.0.1", port, args, mix)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def format_stats(stats):
+    text = f"{stats['requests']:8} requests  {stats['rps']:8.0f} req/s"
+    # A server that answered nothing, e.g. because every request failed, has
+    # no latencies to report.
+    if not stats["requests"]:
+        return text
+    return (
+        f"{text}  p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  "
+        f"p99 {stats['p99_ms']:7.2f}ms"
+    )
+
+
+def print_result(name, result):
+    print(f"{name:8} {format_stats(result)}  errors {result['errors']}")
+    for group in (result["kinds"], result["figures"]):
+        for label, stats in group.items():
+            print(f"  {label:6} {format_stats(stats)}")
+    for error in result["error_samples"]:
+        print("  error", error["status"], error["path"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", default="flask", help="comma separated SERVERS")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--mix", default="check=9,valid=5,invalid=4,batch=2")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument(
+        "--url", help="load this running server instead of starting one"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    names = [name.strip() for name in args.servers.split(",")]
+    if not args.url and any(name not in SERVERS for name in names):
+        parser.error(f"--servers takes a comma separated list of {', '.join(SERVERS)}")
+
+    servers = {}
+    if args.url:
+        url = urlsplit(args.url)
+        servers[args.url] = run(url.hostname, url.port or 80, args, mix)
+    else:
+        for offset, name in enumerate(names):
+            servers[name] = run_server(name, args.port + offset, args, mix)
+    results = {
+        "commit": current_commit(),
+        "config": {"threads": args.threads, "mix": mix},
+        "servers": servers,
+    }
+
+    failed = False
+    for name, result in servers.items():
+        print_result(name, result)
+        failed = failed or bool(result["errors"])
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline.get("config") == results["config"]:
+        for name, result in servers.items():
+            before = baseline["servers"].get(name)
+            if before is None or not before["requests"] or not result["requests"]:
+                continue
+            rps_change = result["rps"] / before["rps"] - 1
+            p99_change = result["p99_ms"] / before["p99_ms"] - 1
+            line = (
+                f"{name} vs baseline {baseline['commit']}: "
+                f"{rps_change:+.1%} req/s  {p99_change:+.1%} p99"
+            )
+            if rps_change < -args.threshold or p99_change > args.threshold:
+                line += "  REGRESSION"
+                failed = True
+            print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+from squares import (
+    BISHOP_DIRECTIONS,
+    FIELD_INDEX,
+    KING_MOVES,
+    KNIGHT_MOVES,
+    PAWN_MOVES,
+    QUEEN_DIRECTIONS,
+    ROOK_DIRECTIONS,
+)
+
+# A bitboard is a plain int with bit n set when square index n (see
+# squares.FIELDS) is part of the set.
+EMPTY = 0
+FULL = (1 << 64) - 1
+BIT = tuple(1 << index for index in range(64))
+
+
+def _ray(index, d):
+    row, col = divmod(index, 8)
+    mask = 0
+    r = row + d[0]
+    c = col + d[1]
+    while -1 < r < 8 and 8 > c > -1:
+        mask |= BIT[r * 8 + c]
+        r += d[0]
+        c += d[1]
+    return mask
+
+
+# RAYS[d][index] holds every square from index (exclusive) to the edge of the
+# board along direction d, for all eight directions used by the sliders.
+RAYS = {d: tuple(_ray(index, d) for index in range(64)) for d in QUEEN_DIRECTIONS}
+
+# Rays towards higher square indices find their first blocker with the lowest
+# set bit, rays towards lower indices with the highest one.
+POSITIVE_DIRECTIONS = frozenset(d for d in QUEEN_DIRECTIONS if d[0] * 8 + d[1] > 0)
+
+
+def _between(source, dest):
+    for d in QUEEN_DIRECTIONS:
+        if RAYS[d][source] & BIT[dest]:
+            return RAYS[d][source] & ~RAYS[d][dest] & ~BIT[dest]
+    return EMPTY
+
+
+# BETWEEN[source][dest] holds the squares strictly between two aligned
+# squares, and is empty for squares that share no rank, file or diagonal.
+BETWEEN = tuple(
+    tuple(_between(source, dest) for dest in range(64)) for source in range(64)
+)
+
+
+def targets(index, directions):
+    """
+    The targets function returns the squares a slider could reach from index on an empty board.
+
+    :param index: Square index of the figure
+    :param directions: Ray directions of the figure
+    :return: A bitboard of all squares along the rays
+    """
+    mask = EMPTY
+    for d in directions:
+        mask |= RAYS[d][index]
+    return mask
+
+
+def mask(fields):
+    """
+    The mask function turns field names into a bitboard.
+
+    :param fields: An iterable of field names
+    :return: A bitboard with the bits of the fields set
+    """
+    result = EMPTY
+    for field in fields:
+        result |= BIT[FIELD_INDEX[field]]
+    return result
+
+
+KING_TARGETS = tuple(mask(fields) for fields in KING_MOVES)
+KNIGHT_TARGETS = tuple(mask(fields) for fields in KNIGHT_MOVES)
+PAWN_TARGETS = tuple(mask(fields) for fields in PAWN_MOVES)
+QUEEN_TARGETS = tuple(targets(index, QUEEN_DIRECTIONS) for index in range(64))
+ROOK_TARGETS = tuple(targets(index, ROOK_DIRECTIONS) for index in range(64))
+BISHOP_TARGETS = tuple(targets(index, BISHOP_DIRECTIONS) for index in range(64))
+
+
+def attacks(index, occupied, directions):
+    """
+    The attacks function returns the squares a slider sees from index, stopping every ray at its first blocker.
+    The blocker itself is part of the result, so callers that only want empty destinations mask it out with ~occupied.
+
+    :param index: Square index of the figure
+    :param occupied: Bitboard of all occupied squares
+    :param directions: Ray directions of the figure
+    :return: A bitboard of the attacked squares
+    """
+    mask = EMPTY
+    for d in directions:
+        ray = RAYS[d][index]
+        blockers = ray & occupied
+        if blockers:
+            if d in POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        mask |= ray
+    return mask
+
+
+def squares(mask):
+    """
+    The squares function yields the square indices of all bits set in mask, lowest first.
+
+    :param mask: A bitboard
+    :return: A generator of square indices
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
@@ -0,0 +1,181 @@
+"""
+Build the slider attack tablebase read by tablebase.Tablebase.
+
+    python build_tablebase.py --output tablebase.bin
+
+Needs NumPy. For every rook and bishop square, a magic multiplier is searched
+that maps every occupancy of the squares able to block the slider to a slot
+of its own attack table (or one with the same attack map). The search is
+seeded, so the same seed always builds the same file. Every lookup is then
+checked against bitboard.attacks on random occupancies.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from bitboard import BIT, POSITIVE_DIRECTIONS, RAYS, attacks
+from squares import BISHOP_DIRECTIONS, ROOK_DIRECTIONS
+from tablebase import (
+    FILE_MAGIC,
+    FORMAT_VERSION,
+    KINDS,
+    TABLES_OFFSET,
+    Tablebase,
+)
+
+DIRECTIONS = {"rook": ROOK_DIRECTIONS, "bishop": BISHOP_DIRECTIONS}
+CANDIDATE_BATCH = 4096
+
+
+def relevant_mask(index, directions):
+    """
+    The relevant_mask function returns the squares whose occupancy changes a slider's attack map.
+    The last square of every ray is left out, as the ray ends there whether it's taken or not.
+
+    :param index: Square index of the slider
+    :param directions: Ray directions of the slider
+    :return: A bitboard of the relevant squares
+    """
+    mask = 0
+    for d in directions:
+        ray = RAYS[d][index]
+        if ray:
+            last = (
+                ray.bit_length() - 1
+                if d in POSITIVE_DIRECTIONS
+                else ((ray & -ray).bit_length() - 1)
+            )
+            mask |= ray & ~BIT[last]
+    return mask
+
+
+def subsets(mask):
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            return
+
+
+def find_magic(index, directions, rng):
+    """
+    The find_magic function searches a magic multiplier for one slider square.
+
+    :param index: Square index of the slider
+    :param directions: Ray directions of the slider
+    :param rng: NumPy random generator
+    :return: A tuple of the mask, the magic, the shift and the attack table as a uint64 array
+    """
+    mask = relevant_mask(index, directions)
+    occupancies = list(subsets(mask))
+    occupied = np.array(occupancies, dtype=np.uint64)
+    expected = np.array(
+        [attacks(index, occupancy, directions) for occupancy in occupancies],
+        dtype=np.uint64,
+    )
+    bits = bin(mask).count("1")
+    shift = np.uint64(64 - bits)
+    table = np.zeros(1 << bits, dtype=np.uint64)
+    while True:
+        # Sparse candidates are far more likely to be magic, and a candidate
+        # that leaves fewer than 6 bits of the mask in the top byte never is.
+        candidates = (
+            rng.integers(0, 2**64, CANDIDATE_BATCH, dtype=np.uint64)
+            & rng.integers(0, 2**64, CANDIDATE_BATCH, dtype=np.uint64)
+            & rng.integers(0, 2**64, CANDIDATE_BATCH, dtype=np.uint64)
+        )
+        top = ((np.uint64(mask) * candidates) >> np.uint64(56)).astype(np.uint8)
+        candidates = candidates[np.unpackbits(top[:, None], axis=1).sum(axis=1) >= 6]
+        for magic in candidates:
+            slots = (occupied * magic) >> shift
+            # If two occupancies with different attack maps share a slot, the
+            # one written last wins and the other one reads back wrong.
+            table[slots] = expected
+            if np.array_equal(table[slots], expected):
+                # Slots no occupancy maps to are never read; zero them so
+                # they don't hold leftovers of rejected candidates.
+                table[:] = 0
+                table[slots] = expected
+                return mask, int(magic), int(shift), table
+
+
+def build(path, seed=0):
+    """
+    The build function writes a tablebase file.
+
+    :param path: Path of the file to write
+    :param seed: Seed of the magic search
+    :return: The size of the file in bytes
+    """
+    rng = np.random.default_rng(seed)
+    params = []
+    tables = []
+    offset = TABLES_OFFSET
+    for kind in KINDS:
+        for index in range(64):
+            mask, magic, shift, table = find_magic(index, DIRECTIONS[kind], rng)
+            params.extend((mask, magic, shift, offset))
+            tables.append(table)
+            offset += len(table)
+    words = np.concatenate(
+        [np.array([FILE_MAGIC, FORMAT_VERSION] + params, dtype=np.uint64)] + tables
+    )
+    words.astype("=u8").tofile(path)
+    return words.nbytes
+
+
+def verify(path, samples=100000, seed=0):
+    """
+    The verify function compares tablebase lookups with bitboard.attacks on random occupancies.
+
+    :param path: Path of the tablebase file
+    :param samples: Number of lookups per slider kind and queen
+    :param seed: Seed of the random occupancies
+    :return: A list of mismatching (figure, square index, occupied) tuples, empty if all agree
+    """
+    rng = random.Random(seed)
+    tablebase = Tablebase(path)
+    mismatches = []
+    try:
+        for name, directions in (
+            ("rook", ROOK_DIRECTIONS),
+            ("bishop", BISHOP_DIRECTIONS),
+            ("queen", ROOK_DIRECTIONS + BISHOP_DIRECTIONS),
+        ):
+            for _ in range(samples):
+                index = rng.randrange(64)
+                occupied = rng.getrandbits(64) & rng.getrandbits(64)
+                if tablebase.attacks(name, index, occupied) != attacks(
+                    index, occupied, directions
+                ):
+                    mismatches.append((name, index, occupied))
+    finally:
+        tablebase.close()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="tablebase.bin")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=100000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    size = build(args.output, args.seed)
+    print(f"wrote {args.output}: {size} bytes in {time.perf_counter() - start:.1f}s")
+    mismatches = verify(args.output, args.samples, args.seed)
+    for mismatch in mismatches[:20]:
+        print("mismatch", *mismatch)
+    if mismatches:
+        sys.exit(f"{len(mismatches)} lookups disagree with bitboard.attacks")
+    print("tablebase agrees with bitboard.attacks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,645 @@
+"""
+Board and figure logic shared by the web app and the command line tools.
+
+Nothing here imports Flask: every function takes the board it works on, and
+results come back as (status code, template) pairs for the caller to turn
+into a response.
+"""
+
+import itertools
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from bitboard import (
+    BIT,
+    BISHOP_TARGETS,
+    KING_TARGETS,
+    KNIGHT_TARGETS,
+    PAWN_TARGETS,
+    QUEEN_TARGETS,
+    ROOK_TARGETS,
+    attacks,
+    squares,
+)
+from fen import ZOBRIST, parse_fen
+from squares import (
+    BISHOP_DIRECTIONS,
+    BISHOP_MOVES,
+    FIELDS,
+    FIELD_INDEX,
+    KING_MOVES,
+    KNIGHT_MOVES,
+    PAWN_MOVES,
+    QUEEN_DIRECTIONS,
+    QUEEN_MOVES,
+    ROOK_DIRECTIONS,
+    ROOK_MOVES,
+)
+from tablebase import open_tablebase
+
+# Slider attack tablebase written by build_tablebase.py. Sliders look their
+# attack maps up in it when the file exists and walk their rays otherwise.
+TABLEBASE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tablebase.bin"
+)
+
+# Mapped once per process; forked workers share the mapping and every
+# process mapping the file shares its pages.
+slider_tablebase = open_tablebase(TABLEBASE_PATH)
+
+# Every change to any board takes the next number, so a version identifies
+# one state of one board.
+board_versions = itertools.count(1)
+
+
+class Board:
+    __slots__ = (
+        "mailbox",
+        "occupied",
+        "figures",
+        "pieces",
+        "sliders",
+        "lock",
+        "version",
+        "key",
+    )
+
+    def __init__(self):
+        # Byte n is the code of the figure on square index n (see FIGURE_CODES),
+        # 0 for an empty square. Codes only use the low three bits; figures
+        # have no colour on this board, so the high bits are always clear.
+        self.mailbox = bytearray(64)
+        self.occupied = 0
+        self.figures = {}
+        self.pieces = {}
+        self.sliders = []
+        self.lock = threading.RLock()
+        self.version = next(board_versions)
+        # Zobrist key of the position, see fen.zobrist_hash.
+        self.key = 0
+
+    def place(self, figure, index):
+        """
+        The place function puts a figure on an empty square.
+        It keeps the mailbox, the occupied bitboard and the attack maps in sync.
+
+        :param self: Access the board state
+        :param figure: The Figure to place
+        :param index: Square index, e.g. 34 for C5
+        :return: The square index
+        """
+        with self.lock:
+            self.mailbox[index] = figure.code
+            self.occupied |= BIT[index]
+            self.key ^= ZOBRIST[figure.name][index]
+            self.pieces[index] = figure
+            self.figures.setdefault(figure.name, figure)
+            figure.square = index
+            if figure.directions is not None:
+                self.sliders.append(figure)
+            self.update_attacks(figure, BIT[index])
+            self.version = next(board_versions)
+        return index
+
+    def move(self, figure, index):
+        """
+        The move function moves a placed figure to an empty square, without checking if the move is permitted.
+
+        :param self: Access the board state
+        :param figure: A Figure standing on this board
+        :param index: Square index of the destination
+        :return: The square index of the destination
+        """
+        with self.lock:
+            changed = BIT[figure.square] | BIT[index]
+            self.mailbox[figure.square] = 0
+            self.mailbox[index] = figure.code
+            self.occupied ^= changed
+            self.key ^= (
+                ZOBRIST[figure.name][figure.square] ^ ZOBRIST[figure.name][index]
+            )
+            del self.pieces[figure.square]
+            self.pieces[index] = figure
+            figure.square = index
+            self.update_attacks(figure, changed)
+            self.version = next(board_versions)
+        return index
+
+    def update_attacks(self, figure, changed):
+        """
+        The update_attacks function refreshes the attack maps after the occupancy of some squares changed.
+        Only the figure that was placed or moved and the sliders with a ray over a changed square are recomputed;
+        leapers only ever see their fixed target squares.
+
+        :param self: Access the board state
+        :param figure: The Figure that was placed or moved
+        :param changed: Bitboard of the squares whose occupancy changed
+        """
+        figure.attacked = figure.attack_map(self.occupied)
+        for slider in self.sliders:
+            if slider is not figure and slider.targets[slider.square] & changed:
+                slider.attacked = slider.attack_map(self.occupied)
+
+
+class Figure(ABC):
+    # Figures only hold their board, their square index and their attack map:
+    # the squares the figure sees from its square, with slider rays stopping
+    # at (and including) their first blocker. The empty squares of the attack
+    # map are the valid moves.
+    __slots__ = ("board", "square", "attacked")
+    # Bitboard table of the squares the figure could reach from every square
+    # on an empty board, and the ray directions of sliding figures.
+    targets = None
+    directions = None
+
+    def __init__(self, square, board):
+        self.board = board
+        self.square = None
+        self.attacked = 0
+        if not self.board.mailbox[square]:
+            self.board.place(self, square)
+
+    @property
+    def current_field(self):
+        """
+        The current_field property names the field the figure stands on.
+
+        :param self: Access the square index
+        :return: The field name, e.g. "C5", or None if the figure isn't on the board
+        """
+        return FIELDS[self.square] if self.square is not None else None
+
+    @abstractmethod
+    def list_available_moves(self):
+        """
+        The list_available_moves function accepts a board object as an argument and returns a list of all the possible moves that can be made on that board.
+        The function should return an empty list if there are no available moves.
+
+        :param self: Refer to the object itself
+        :return: A list of all the possible moves that can be made by a player
+        :doc-author: Trelent
+        """
+        pass
+
+    def attack_map(self, occupied):
+        """
+        The attack_map function computes the squares the figure sees from its field.
+
+        :param self: Access the class attributes
+        :param occupied: Bitboard of all occupied squares
+        :return: A bitboard of the attacked squares
+        """
+        if self.directions is None:
+            return self.targets[self.square]
+        if slider_tablebase is not None:
+            return slider_tablebase.attacks(self.name, self.square, occupied)
+        return attacks(self.square, occupied, self.directions)
+
+    def move_squares(self):
+        """
+        The move_squares function lists the destinations validate_move accepts, as square indexes.
+
+        :param self: Access the board state
+        :return: A generator of square indexes in ascending order
+        """
+        return squares(self.attacked & ~self.board.occupied)
+
+    def move_count(self):
+        """
+        The move_count function counts the destinations validate_move accepts without listing them.
+
+        :param self: Access the board state
+        :return: The number of permitted moves
+        """
+        return (self.attacked & ~self.board.occupied).bit_count()
+
+    def validate_move(self, dest_field):
+        """
+        The validate_move function checks to see if the move is valid.
+        It does this by checking if the space is empty and within bounds of the board.
+        If it passes these tests, then it returns True.
+
+        :param self: Access the class attributes
+        :param dest_field: Check if the destination field is empty
+        :return: A boolean value
+        :doc-author: Trelent
+        """
+        index = FIELD_INDEX.get(dest_field)
+        if index is not None and self.attacked & ~self.board.occupied & BIT[index]:
+            return "valid", None
+        else:
+            return "invalid", "Current move is not permitted"
+
+    def check_result(self, current_field):
+        """
+        The check_result function builds the check_message response without aborting the request.
+        It is used wherever an error has to be reported next to other results, like the batch endpoint.
+
+        :param self: Access the class attributes and methods
+        :param current_field: Check if the current field is equal to the field that was sent by the user
+        :return: A tuple of the HTTP status code and the response template
+        """
+        if self.current_field == current_field:
+            template = [
+                {
+                    "availableMoves": self.list_available_moves(),
+                    "error": None,
+                    "figure": self.name,
+                    "currentField": self.current_field,
+                }
+            ]
+            return 200, template
+        elif current_field in FIELD_INDEX:
+            template = [
+                {
+                    "availableMoves": [],
+                    "error": "Wrong figure",
+                    "figure": None,
+                    "currentField": None,
+                }
+            ]
+            return 404, template
+        else:
+            template = [
+                {
+                    "availableMoves": [],
+                    "error": "Field doesn't exist",
+                    "figure": None,
+                    "currentField": None,
+                }
+            ]
+            return 409, template
+
+    def validate_result(self, current_field, dest_field):
+        """
+        The validate_result function builds the validate_message response without aborting the request.
+
+        :param self: Access the class attributes and methods
+        :param current_field: Determine the current position of the figure
+        :param dest_field: Check if the destination field is occupied by another figure
+        :return: A tuple of the HTTP status code and the response template
+        """
+        move, error = self.validate_move(dest_field)
+        template = [
+            {
+                "move": move,
+                "figure": self.name,
+                "error": error,
+                "currentField": current_field,
+                "destField": dest_field,
+            }
+        ]
+        if move == "valid":
+            return 200, template
+        elif dest_field not in FIELD_INDEX:
+            return 404, template
+        else:
+            return 409, template
+
+
+class King(Figure):
+    __slots__ = ()
+    name = "king"
+    code = 1
+    targets = KING_TARGETS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(KING_MOVES[self.square])
+
+
+class Queen(Figure):
+    __slots__ = ()
+    name = "queen"
+    code = 2
+    targets = QUEEN_TARGETS
+    directions = QUEEN_DIRECTIONS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(QUEEN_MOVES[self.square])
+
+
+class Rook(Figure):
+    __slots__ = ()
+    name = "rook"
+    code = 3
+    targets = ROOK_TARGETS
+    directions = ROOK_DIRECTIONS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(ROOK_MOVES[self.square])
+
+
+class Bishop(Figure):
+    __slots__ = ()
+    name = "bishop"
+    code = 4
+    targets = BISHOP_TARGETS
+    directions = BISHOP_DIRECTIONS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(BISHOP_MOVES[self.square])
+
+
+class Knight(Figure):
+    __slots__ = ()
+    name = "knight"
+    code = 5
+    targets = KNIGHT_TARGETS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(KNIGHT_MOVES[self.square])
+
+
+class Pawn(Figure):
+    __slots__ = ()
+    name = "pawn"
+    code = 6
+    targets = PAWN_TARGETS
+
+    def __init__(self, square, board):
+        super().__init__(square, board)
+
+    def list_available_moves(self):
+        return list(PAWN_MOVES[self.square])
+
+
+FIGURES = (King, Queen, Rook, Bishop, Knight, Pawn)
+FIGURE_CODES = {figure.name: figure.code for figure in FIGURES}
+
+
+def wrong_figure_template():
+    """
+    The wrong_figure_template function builds the check_message template reported when no such figure is on the board.
+
+    :return: A list with a single error dictionary
+    """
+    return [
+        {
+            "availableMoves": [],
+            "error": "Wrong figure",
+            "figure": None,
+            "currentField": None,
+        }
+    ]
+
+
+def encode_board(state_board):
+    """
+    The encode_board function packs the figures of a board into one byte per square.
+    Byte n holds the FIGURE_CODES value of the figure on square index n, or 0 for an empty field.
+
+    :param state_board: The board to encode
+    :return: A bytes object of length 64
+    """
+    return bytes(state_board.mailbox)
+
+
+def decode_board(state):
+    """
+    The decode_board function rebuilds a board from the bytes returned by encode_board.
+
+    :param state: A bytes object of length 64
+    :return: A new Board with the figures placed in square index order
+    """
+    state_board = Board()
+    for square, code in enumerate(state):
+        if code:
+            FIGURES[code - 1](square, state_board)
+    return state_board
+
+
+def placements_board(placements):
+    """
+    The placements_board function builds a board from the placements returned by parse_fen.
+
+    :param placements: A list of (figure name, square index) tuples
+    :return: A new Board
+    """
+    state = bytearray(64)
+    for name, square in placements:
+        state[square] = FIGURE_CODES[name]
+    return decode_board(state)
+
+
+def load_position(fen):
+    """
+    The load_position function builds a board from a FEN piece placement.
+
+    :param fen: A FEN string
+    :return: A new Board with the figures of the FEN
+    :raises ValueError: If the FEN is malformed
+    """
+    return placements_board(parse_fen(fen))
+
+
+def board_figure(state_board, figure, current_field):
+    """
+    The board_figure function finds the figure a request is asking about on a given board.
+    The figure standing on current_field is preferred, otherwise the first figure of that type is used,
+    so the usual "Wrong figure" and "Field doesn't exist" errors are reported.
+
+    :param state_board: The board to look at
+    :param figure: Name of the figure
+    :param current_field: Field sent by the user
+    :return: The Figure instance, or None if there is no such figure on the board
+    """
+    piece = state_board.pieces.get(FIELD_INDEX.get(current_field))
+    if piece is None or piece.name != figure:
+        piece = state_board.figures.get(figure)
+    return piece
+
+
+def analyze_board(state_board):
+    """
+    The analyze_board function sums up the mobility and attacks of every figure on a board in one pass.
+    It reads the attack maps the board keeps up to date (see Board.update_attacks), so sliders stop at
+    the first figure of every ray exactly like in validate_move. Heatmaps are indexed by square index,
+    in the order of squares.FIELDS.
+
+    :param state_board: The board to analyze
+    :return: A dictionary with a summary per figure and per kind of figure, the attack and mobility
+             heatmaps, the fields attacked by more than one figure and the figures no other figure attacks
+    """
+    attack_heatmap = [0] * 64
+    mobility_heatmap = [0] * 64
+    figures = []
+    totals = {}
+    attacked = contested = 0
+    for index, piece in sorted(state_board.pieces.items()):
+        reachable = piece.attacked & ~state_board.occupied
+        attacked_fields = []
+        for square in squares(piece.attacked):
+            attack_heatmap[square] += 1
+            attacked_fields.append(FIELDS[square])
+        mobility = 0
+        for square in squares(reachable):
+            mobility_heatmap[square] += 1
+            mobility += 1
+        contested |= attacked & piece.attacked
+        attacked |= piece.attacked
+        figures.append(
+            {
+                "figure": piece.name,
+                "field": FIELDS[index],
+                "mobility": mobility,
+                "attacks": len(attacked_fields),
+                "attackedFields": attacked_fields,
+            }
+        )
+        total = totals.setdefault(
+            piece.name, {"figures": 0, "mobility": 0, "attacks": 0}
+        )
+        total["figures"] += 1
+        total["mobility"] += mobility
+        total["attacks"] += len(attacked_fields)
+    # A figure never attacks its own field, so any attack on it comes from another figure.
+    for summary in figures:
+        summary["defended"] = bool(attacked & BIT[FIELD_INDEX[summary["field"]]])
+    return {
+        "figures": figures,
+        "totals": totals,
+        "mobility": sum(summary["mobility"] for summary in figures),
+        "attackHeatmap": attack_heatmap,
+        "mobilityHeatmap": mobility_heatmap,
+        "contestedFields": [FIELDS[square] for square in squares(contested)],
+        "undefendedFields": [
+            summary["field"] for summary in figures if not summary["defended"]
+        ],
+    }
+
+
+def run_query(query, state_board, by_field=True):
+    """
+    The run_query function evaluates a single batch query against a board.
+    A query with a destField is validated like validate_available_moves, any other query is checked like check_available_moves.
+
+    :param query: A dictionary with the figure, currentField and optional destField keys
+    :param state_board: The board to answer for
+    :param by_field: Ask the figure standing on currentField (see board_figure), or if False the first
+                     figure of its kind, like the routes of the served board do
+    :return: A dictionary with the status code and the response template of the query
+    """
+    if (
+        not isinstance(query, dict)
+        or not isinstance(query.get("figure"), str)
+        or not isinstance(query.get("currentField"), str)
+        or not isinstance(query.get("destField", ""), str)
+    ):
+        return {"status": 400, "result": "Malformed query"}
+    if by_field:
+        figure = board_figure(state_board, query["figure"], query["currentField"])
+    else:
+        figure = state_board.figures.get(query["figure"])
+    if figure is None:
+        return {"status": 404, "result": wrong_figure_template()}
+    if "destField" in query:
+        status, template = figure.validate_result(
+            query["currentField"], query["destField"]
+        )
+    else:
+        status, template = figure.check_result(query["currentField"])
+    return {"status": status, "result": template}
+
+
+def parse_move_line(line):
+    """
+    The parse_move_line function reads one input line.
+
+    :param line: A line of NDJSON or a plain move
+    :return: A dict like a batch query, a dict with a fen key, or None for blank lines
+    :raises ValueError: If the line can't be read
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        query = json.loads(line)
+        if "fen" in query and isinstance(query["fen"], str):
+            return {"fen": query["fen"]}
+        # The figure is optional, as in plain moves; if given, it has to be
+        # the one standing on currentField.
+        if not all(
+            isinstance(query.get(key), str) for key in ("currentField", "destField")
+        ) or not isinstance(query.get("figure", ""), str):
+            raise ValueError("Malformed move")
+        return query
+    fields = line.replace("-", " ").split()
+    if len(fields) == 1 and len(fields[0]) == 4:
+        fields = [fields[0][:2], fields[0][2:]]
+    if len(fields) != 2:
+        raise ValueError("Malformed move")
+    return {"currentField": fields[0].upper(), "destField": fields[1].upper()}
+
+
+def replay_moves(lines, position):
+    """
+    The replay_moves function validates and plays a sequence of moves, one verdict per input line.
+    It is a generator, so neither the input nor the verdicts are ever held in memory as a whole.
+
+    :param lines: An iterable of input lines
+    :param position: The board to play on; it is changed in place
+    :return: A generator of verdict dictionaries with the line number, status code and result template
+    """
+    for number, line in enumerate(lines, 1):
+        try:
+            move = parse_move_line(line)
+        except ValueError:
+            yield {"line": number, "status": 400, "result": "Malformed move"}
+            continue
+        if move is None:
+            continue
+        if "fen" in move:
+            try:
+                position = load_position(move["fen"])
+            except ValueError as e:
+                yield {"line": number, "status": 400, "result": str(e)}
+                continue
+            yield {"line": number, "status": 200, "result": "New position"}
+            continue
+        piece = position.pieces.get(FIELD_INDEX.get(move["currentField"]))
+        if piece is None or piece.name != move.get("figure", piece.name):
+            template = [
+                {
+                    "move": "invalid",
+                    "figure": move.get("figure"),
+                    "error": "Wrong figure",
+                    "currentField": move["currentField"],
+                    "destField": move["destField"],
+                }
+            ]
+            yield {"line": number, "status": 404, "result": template}
+            continue
+        status, template = piece.validate_result(
+            move["currentField"], move["destField"]
+        )
+        if status == 200:
+            position.move(piece, FIELD_INDEX[move["destField"]])
+        yield {"line": number, "status": status, "result": template}
+
+
+def ndjson_lines(verdicts):
+    """
+    The ndjson_lines function serializes verdicts as NDJSON lines.
+
+    :param verdicts: An iterable of verdict dictionaries
+    :return: A generator of strings, one JSON document and newline each
+    """
+    for verdict in verdicts:
+        yield json.dumps(verdict, separators=(",", ":")) + "\n"
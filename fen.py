@@ -0,0 +1,152 @@
+import random
+import threading
+from collections import OrderedDict
+
+FEN_FIGURES = {
+    "k": "king",
+    "q": "queen",
+    "r": "rook",
+    "b": "bishop",
+    "n": "knight",
+    "p": "pawn",
+}
+FIGURE_LETTERS = {name: letter.upper() for letter, name in FEN_FIGURES.items()}
+
+# One fixed random 64-bit key per (figure, square index); the seed keeps the
+# hashes stable across processes and restarts.
+_rng = random.Random(0x5EED)
+ZOBRIST = {
+    name: tuple(_rng.getrandbits(64) for _ in range(64))
+    for name in FEN_FIGURES.values()
+}
+
+
+def parse_fen(fen):
+    """
+    The parse_fen function reads the piece placement of a FEN string.
+    Only the first field of the FEN is used. The board has no colours, so upper and lower case letters
+    name the same figure.
+
+    :param fen: A FEN string, e.g. "8/3q4/5p2/2pk4/2p1pr2/2pbp3/2n5/8 w - - 0 1"
+    :return: A list of (figure name, square index) tuples
+    :raises ValueError: If the placement is malformed
+    """
+    ranks = fen.strip().split(" ")[0].split("/")
+    if len(ranks) != 8:
+        raise ValueError("A FEN placement needs 8 ranks")
+    placements = []
+    for rank, row in enumerate(ranks):
+        col = 0
+        for char in row:
+            if char.isdigit():
+                col += int(char)
+            elif char.lower() in FEN_FIGURES:
+                if col > 7:
+                    raise ValueError(
+                        f"Rank {8 - rank} of the FEN has more than 8 fields"
+                    )
+                placements.append((FEN_FIGURES[char.lower()], (7 - rank) * 8 + col))
+                col += 1
+            else:
+                raise ValueError(f"Unknown figure {char!r} in FEN")
+        if col != 8:
+            raise ValueError(f"Rank {8 - rank} of the FEN doesn't have 8 fields")
+    return placements
+
+
+def to_fen(pieces):
+    """
+    The to_fen function writes the piece placement of a position as the first field of a FEN string.
+
+    :param pieces: A mapping of square index to figure name
+    :return: The FEN piece placement, e.g. "8/3Q4/5P2/2PK4/2P1PR2/2PBP3/2N5/8"
+    """
+    ranks = []
+    for row in range(7, -1, -1):
+        rank = ""
+        empty = 0
+        for col in range(8):
+            name = pieces.get(row * 8 + col)
+            if name is None:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += FIGURE_LETTERS[name]
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    return "/".join(ranks)
+
+
+def zobrist_hash(placements):
+    """
+    The zobrist_hash function computes the Zobrist hash of a position.
+
+    :param placements: An iterable of (figure name, square index) tuples
+    :return: A 64-bit int identifying the position
+    """
+    key = 0
+    for name, square in placements:
+        key ^= ZOBRIST[name][square]
+    return key
+
+
+class MoveCache:
+    """
+    Bounded, thread-safe LRU cache with hit and miss counters.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        The get function looks a key up and counts the hit or miss.
+
+        :param self: Access the cache
+        :param key: A hashable cache key
+        :return: The cached value, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        The put function stores a value and drops the least recently used entries beyond maxsize.
+
+        :param self: Access the cache
+        :param key: A hashable cache key
+        :param value: The value to store, anything but None
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        The stats function reports the counters used to size the cache.
+
+        :param self: Access the cache
+        :return: A dictionary with the hits, misses, size and maxsize of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
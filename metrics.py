@@ -0,0 +1,192 @@
+"""
+Counters and histograms rendered in the Prometheus text exposition format.
+
+Every metric keeps one series per tuple of label values. Updates take a
+per-metric lock and a dict lookup, so they are cheap enough for every
+request.
+"""
+
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from a response cache hit to a large batch.
+LATENCY_BUCKETS = (
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+
+def _labels(names, values, extra=""):
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values) if value
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _series_order(item):
+    # Label values may be None (left out of the output), so sort by their text.
+    return tuple("" if value is None else str(value) for value in item[0])
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """
+    A monotonically increasing count per tuple of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """
+        The inc function adds to the count of a series.
+
+        :param self: Access the counter
+        :param labels: Label values, in the order of labelnames
+        :param amount: Number to add
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items(), key=_series_order)
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per tuple of label values, with their sum.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        The observe function records one observation.
+
+        :param self: Access the histogram
+        :param value: The observed value, e.g. a duration in seconds
+        :param labels: Label values, in the order of labelnames
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        """
+        The time function returns a context manager observing the duration of its with block in seconds.
+
+        :param self: Access the histogram
+        :param labels: Label values, in the order of labelnames
+        :return: The context manager
+        """
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted(
+                (
+                    (labels, list(counts), total)
+                    for labels, (counts, total) in self._series.items()
+                ),
+                key=_series_order,
+            )
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labelset = _labels(self.labelnames, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{labelset} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    """
+    The set of metrics exposed together on one endpoint.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        The render function writes every metric in the Prometheus text exposition format.
+
+        :param self: Access the registry
+        :return: The exposition text
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
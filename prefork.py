@@ -0,0 +1,148 @@
+"""
+Serve the move API from several pre-forked worker processes sharing one board.
+
+    python prefork.py --workers 8 --port 8000
+
+The parent binds the port, puts the board into a SharedBoard and forks the
+workers, which all accept on the same socket. Before every request a worker
+compares the shared sequence number with the one its board was built from
+and rebuilds its board only when another worker has published a new one:
+
+    curl -X PUT localhost:8000/api/v1/board -H "Content-Type: application/json" \\
+        -d '{"fen": "8/8/8/3K4/8/8/8/8"}'
+
+Games and caches stay local to each worker. Needs os.fork, so POSIX only.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+
+from flask import abort, jsonify, request
+from werkzeug.serving import make_server
+
+import app
+from fen import to_fen
+from shared_board import SharedBoard
+
+shared = None
+synced_sequence = None
+sync_lock = threading.Lock()
+
+
+def sync_board():
+    """
+    The sync_board function brings the board of this worker up to date with the shared board.
+    Only the sequence number is read unless the board changed since the last sync.
+
+    The shared buffer is not served from in place: on a change its 64 bytes are copied and a worker-local
+    Board is rebuilt, since the routes need Figure objects and attack maps, which can't live in shared
+    memory. That costs one copy and rebuild per published board per worker, not per request. The new
+    board replaces app.board in one assignment; routes read app.board once per request, so requests
+    already running finish on the board they started with.
+    """
+    global synced_sequence
+    if shared.sequence() == synced_sequence:
+        return
+    with sync_lock:
+        if shared.sequence() == synced_sequence:
+            return
+        sequence, state = shared.read()
+        app.board = app.decode_board(state)
+        synced_sequence = sequence
+
+
+def publish_board():
+    """
+    The publish_board function replaces the board served by every worker with a FEN piece placement.
+
+    :return: The normalized FEN and the sequence number of the new board
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("fen"), str):
+        abort(400, description="Expected a JSON object with a fen string")
+    try:
+        position = app.load_position(body["fen"])
+    except ValueError as e:
+        abort(400, description=str(e))
+    sequence = shared.write(app.encode_board(position))
+    sync_board()
+    fen = to_fen({square: figure.name for square, figure in position.pieces.items()})
+    return jsonify({"fen": fen, "sequence": sequence})
+
+
+def serve_worker(host, port, listener):
+    server = make_server(host, port, app.API.app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def serve(host, port, workers):
+    """
+    The serve function forks the workers and waits for them.
+    The module-level board of app must be set up before calling it.
+
+    :param host: Address to listen on
+    :param port: Port to listen on
+    :param workers: Number of worker processes
+    """
+    global shared, synced_sequence
+    app.API.app.before_request(sync_board)
+    app.API.app.add_url_rule("/api/v1/board", view_func=publish_board, methods=["PUT"])
+    shared = SharedBoard(app.encode_board(app.board))
+    # Workers start out with the board inherited from the parent, so the
+    # figure a route picks for a figure name is the same as in app.py.
+    synced_sequence = shared.sequence()
+    if app.WARM_RESPONSE_CACHE:
+        app.API.warm_response_cache()
+    listener = socket.create_server((host, port), backlog=1024)
+    children = []
+    try:
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    serve_worker(host, port, listener)
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ChildProcessError, ProcessLookupError):
+                pass
+        listener.close()
+        shared.close()
+        shared.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=0, help="0 for one per CPU (default)"
+    )
+    parser.add_argument("--fen", help="starting position, the demo board if omitted")
+    args = parser.parse_args()
+
+    if args.fen is None:
+        app.setup_demo_board()
+    else:
+        try:
+            app.board = app.load_position(args.fen)
+        except ValueError as e:
+            parser.error(str(e))
+    serve(args.host, args.port, args.workers or os.cpu_count() or 1)
+
+
+if __name__ == "__main__":
+    main()
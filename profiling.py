@@ -0,0 +1,193 @@
+"""
+Profilers for a single request, reporting hot frames and collapsed stacks.
+
+A TracingProfiler records every Python and C call made by the thread that
+started it. A SamplingProfiler looks at that thread's stack from a
+background thread at a fixed interval, which costs far less for long
+requests but misses short ones. Both add up time per call stack, which
+gives the collapsed-stack format read by flamegraph.pl and speedscope:
+
+    dispatch_request (app.py:885);check_available_moves (app.py:640) 212
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+
+# The switch interval is process-wide, so overlapping SamplingProfilers share
+# one lowered interval: the first to start saves the original and the last to
+# stop puts it back.
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_saved = None
+
+
+def _code_label(code):
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class Profiler(ABC):
+    def __init__(self):
+        # Seconds spent with exactly this call stack, outermost frame first.
+        self.stacks = Counter()
+
+    @abstractmethod
+    def start(self):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+    def top_frames(self, limit=25):
+        """
+        The top_frames function lists the frames the profiled code spent the most time in.
+
+        :param self: Access the recorded stacks
+        :param limit: Number of frames to return
+        :return: A list of dictionaries with the frame and its self and total time in seconds, by self time
+        """
+        own = Counter()
+        total = Counter()
+        for stack, seconds in self.stacks.items():
+            own[stack[-1]] += seconds
+            for frame in set(stack):
+                total[frame] += seconds
+        return [
+            {"frame": frame, "self": seconds, "total": total[frame]}
+            for frame, seconds in own.most_common(limit)
+        ]
+
+    def collapsed(self):
+        """
+        The collapsed function writes the recorded stacks in the collapsed-stack format, in microseconds.
+
+        :param self: Access the recorded stacks
+        :return: One "frame;frame;frame count" line per stack
+        """
+        return "".join(
+            f"{';'.join(stack)} {round(seconds * 1e6)}\n"
+            for stack, seconds in sorted(self.stacks.items())
+            if round(seconds * 1e6)
+        )
+
+
+class TracingProfiler(Profiler):
+    """
+    Deterministic profiler built on sys.setprofile.
+
+    Frames that were already running when it started are not recorded, so
+    the stacks begin at the calls made after start.
+    """
+
+    def start(self):
+        self._stack = []
+        self._last = time.perf_counter()
+        sys.setprofile(self._event)
+
+    def stop(self):
+        sys.setprofile(None)
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter()
+        if self._stack:
+            self.stacks[tuple(self._stack)] += now - self._last
+        if event == "call":
+            self._stack.append(_code_label(frame.f_code))
+        elif event == "c_call":
+            self._stack.append(f"{getattr(arg, '__qualname__', arg)} (builtin)")
+        elif self._stack:
+            self._stack.pop()
+        self._last = time.perf_counter()
+
+
+class SamplingProfiler(Profiler):
+    """
+    Statistical profiler that samples the stack of the profiled thread.
+    """
+
+    def __init__(self, interval=0.0005):
+        super().__init__()
+        self.interval = interval
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._done = threading.Event()
+        # The sampler only runs when the profiled thread lets go of the GIL,
+        # which a busy thread does every switch interval (5ms by default).
+        _lower_switch_interval(self.interval)
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._done.set()
+        self._sampler.join()
+        _restore_switch_interval()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_code_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += self.interval
+
+
+def _lower_switch_interval(interval):
+    global _switch_users, _switch_saved
+    with _switch_lock:
+        if _switch_users == 0:
+            _switch_saved = sys.getswitchinterval()
+        _switch_users += 1
+        sys.setswitchinterval(min(sys.getswitchinterval(), interval))
+
+
+def _restore_switch_interval():
+    global _switch_users
+    with _switch_lock:
+        _switch_users -= 1
+        if _switch_users == 0:
+            sys.setswitchinterval(_switch_saved)
+
+
+PROFILERS = {"trace": TracingProfiler, "sample": SamplingProfiler}
+
+
+def write_dump(directory, name, profiler, info, keep=100, limit=25):
+    """
+    The write_dump function saves a profile to a directory that keeps only the newest dumps.
+    Every dump is a JSON file with the top frames and a .folded file with the collapsed stacks.
+
+    :param directory: Directory to write to, created if missing
+    :param name: Short description used in the file names, e.g. the figure
+    :param profiler: The stopped profiler
+    :param info: Dictionary of request details stored with the top frames
+    :param keep: Number of dumps to keep
+    :param limit: Number of top frames to store
+    :return: The file name of the dump without extension
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{time.perf_counter_ns()}-{name}"
+    with open(os.path.join(directory, stem + ".json"), "w") as f:
+        json.dump(dict(info, frames=profiler.top_frames(limit)), f, indent=2)
+    with open(os.path.join(directory, stem + ".folded"), "w") as f:
+        f.write(profiler.collapsed())
+    dumps = sorted(
+        (entry.path for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=os.path.getmtime,
+    )
+    for old in dumps[: max(len(dumps) - keep, 0)]:
+        for path in (old, old[: -len(".json")] + ".folded"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return stem
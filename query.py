@@ -0,0 +1,62 @@
+"""
+Answer batch queries against one position and print a verdict per query as NDJSON.
+
+Input is read line by line, one query per line like the batch endpoint takes:
+{"figure": "pawn", "currentField": "C5"} lists the moves of a figure and
+{"figure": "pawn", "currentField": "C5", "destField": "C6"} validates one.
+Queries ask the figure standing on currentField, like the FEN routes, so
+every pawn of a position can be asked about. The board is never changed. Every non-blank line gets one verdict:
+
+    {"line":1,"status":200,"result":[...]}
+
+    python query.py --fen "8/3Q4/5P2/2PK4/2P1PR2/2PBP3/2N5/8" queries.ndjson
+
+Only the core modules are imported, never Flask, so short runs from cron
+spend their time answering queries rather than starting up.
+"""
+
+import argparse
+import fileinput
+import json
+import sys
+
+from core import load_position, ndjson_lines, run_query
+
+
+def answer_queries(lines, position):
+    """
+    The answer_queries function runs every query line against a board, one verdict per line.
+
+    :param lines: An iterable of NDJSON query lines
+    :param position: The board to answer for
+    :return: A generator of verdict dictionaries with the line number, status code and result template
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            query = json.loads(line)
+        except ValueError:
+            yield {"line": number, "status": 400, "result": "Malformed query"}
+            continue
+        yield {"line": number, **run_query(query, position)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="input files, stdin if omitted")
+    parser.add_argument("--fen", required=True, help="position to answer for")
+    args = parser.parse_args()
+
+    try:
+        position = load_position(args.fen)
+    except ValueError as e:
+        parser.error(str(e))
+    with fileinput.input(args.files) as lines:
+        for chunk in ndjson_lines(answer_queries(lines, position)):
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class GameStore:
+    """
+    Thread-safe registry of game states keyed by game ID.
+
+    Games are kept in least recently used order. A game is dropped once it
+    hasn't been used for ttl seconds, and the least recently used games are
+    dropped whenever the store grows past max_games, which caps its memory.
+    """
+
+    def __init__(self, max_games=10000, ttl=3600, clock=time.monotonic):
+        self.max_games = max_games
+        self.ttl = ttl
+        self.clock = clock
+        self._games = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._games)
+
+    def create(self, state):
+        """
+        The create function stores the state of a new game.
+
+        :param self: Access the store
+        :param state: Compact game state, e.g. the bytes returned by encode_board
+        :return: The ID of the new game
+        """
+        game_id = secrets.token_urlsafe(12)
+        with self._lock:
+            now = self.clock()
+            self._games[game_id] = (state, now)
+            self._evict(now)
+        return game_id
+
+    def get(self, game_id):
+        """
+        The get function returns the state of a game and marks the game as recently used.
+
+        :param self: Access the store
+        :param game_id: ID returned by create
+        :return: The game state, or None if the game doesn't exist or has expired
+        """
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            entry = self._games.get(game_id)
+            if entry is None:
+                return None
+            self._games[game_id] = (entry[0], now)
+            self._games.move_to_end(game_id)
+            return entry[0]
+
+    def delete(self, game_id):
+        """
+        The delete function removes a game from the store.
+
+        :param self: Access the store
+        :param game_id: ID returned by create
+        :return: True if the game existed, False otherwise
+        """
+        with self._lock:
+            return self._games.pop(game_id, None) is not None
+
+    def _evict(self, now):
+        # Entries are ordered by last use, so expired games are always at the
+        # front of the dict.
+        while self._games:
+            game_id, (_, last_used) = next(iter(self._games.items()))
+            if now - last_used < self.ttl and len(self._games) <= self.max_games:
+                break
+            del self._games[game_id]
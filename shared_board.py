@@ -0,0 +1,86 @@
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+
+# Layout of the buffer: an 8-byte sequence counter followed by the 64-byte
+# encode_board state.
+_SEQUENCE = struct.Struct("<Q")
+STATE_OFFSET = _SEQUENCE.size
+STATE_SIZE = 64
+
+
+class SharedBoard:
+    """
+    Board state shared between processes through a shared memory buffer.
+
+    The state is the 64-byte encode_board format, guarded by a seqlock: a
+    writer makes the sequence counter odd, writes the state and makes it even
+    again, and a reader retries if the counter was odd or changed while it
+    copied the state. Readers never take a lock, and a reader that only wants
+    to know whether the board changed reads the 8-byte counter alone.
+    Writers are serialized by a process-shared lock.
+
+    Create it before forking so that the children inherit the mapping and the
+    lock, and close and unlink it in the parent when all of them are done.
+    """
+
+    def __init__(self, state=bytes(STATE_SIZE), lock=None):
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=STATE_OFFSET + STATE_SIZE
+        )
+        self._buffer = self._memory.buf
+        self._lock = lock if lock is not None else multiprocessing.Lock()
+        _SEQUENCE.pack_into(self._buffer, 0, 0)
+        self._buffer[STATE_OFFSET:] = bytes(state)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def sequence(self):
+        """
+        The sequence function returns the sequence counter without touching the state.
+        It grows by 2 with every write and is odd while a write is in progress.
+
+        :param self: Access the shared buffer
+        :return: The current sequence number
+        """
+        return _SEQUENCE.unpack_from(self._buffer, 0)[0]
+
+    def read(self):
+        """
+        The read function copies a consistent snapshot of the state.
+
+        :param self: Access the shared buffer
+        :return: A tuple of the (even) sequence number and the 64-byte state
+        """
+        while True:
+            before = self.sequence()
+            if before & 1:
+                continue
+            state = bytes(self._buffer[STATE_OFFSET:])
+            if self.sequence() == before:
+                return before, state
+
+    def write(self, state):
+        """
+        The write function replaces the state.
+
+        :param self: Access the shared buffer
+        :param state: The new 64-byte state
+        :return: The sequence number readers will see with the new state
+        """
+        if len(state) != STATE_SIZE:
+            raise ValueError(f"Board state must be {STATE_SIZE} bytes")
+        with self._lock:
+            sequence = self.sequence()
+            _SEQUENCE.pack_into(self._buffer, 0, sequence + 1)
+            self._buffer[STATE_OFFSET:] = state
+            _SEQUENCE.pack_into(self._buffer, 0, sequence + 2)
+        return sequence + 2
+
+    def close(self):
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.unlink()
@@ -0,0 +1,133 @@
+from collections import deque
+
+from bitboard import BIT, attacks, squares
+from squares import (
+    BISHOP_DIRECTIONS,
+    BISHOP_MOVES,
+    FIELD_INDEX,
+    KING_MOVES,
+    KNIGHT_MOVES,
+    PAWN_MOVES,
+    QUEEN_DIRECTIONS,
+    QUEEN_MOVES,
+    ROOK_DIRECTIONS,
+    ROOK_MOVES,
+)
+
+EMPTY_BOARD_STEPS = {
+    name: tuple(tuple(FIELD_INDEX[field] for field in targets) for targets in table)
+    for name, table in (
+        ("king", KING_MOVES),
+        ("queen", QUEEN_MOVES),
+        ("rook", ROOK_MOVES),
+        ("bishop", BISHOP_MOVES),
+        ("knight", KNIGHT_MOVES),
+        ("pawn", PAWN_MOVES),
+    )
+}
+SLIDER_DIRECTIONS = {
+    "queen": QUEEN_DIRECTIONS,
+    "rook": ROOK_DIRECTIONS,
+    "bishop": BISHOP_DIRECTIONS,
+}
+
+
+def _distances_from(steps, source):
+    distances = [None] * 64
+    distances[source] = 0
+    queue = deque([source])
+    while queue:
+        index = queue.popleft()
+        for target in steps[index]:
+            if distances[target] is None:
+                distances[target] = distances[index] + 1
+                queue.append(target)
+    return tuple(distances)
+
+
+# DISTANCES[figure][source][dest] is the minimum number of moves on an empty
+# board, or None when the figure can never get there (e.g. a pawn moving down).
+DISTANCES = {
+    name: tuple(_distances_from(steps, source) for source in range(64))
+    for name, steps in EMPTY_BOARD_STEPS.items()
+}
+
+
+def _steps(name, index, occupied):
+    if name in SLIDER_DIRECTIONS:
+        return squares(attacks(index, occupied, SLIDER_DIRECTIONS[name]) & ~occupied)
+    return (
+        target
+        for target in EMPTY_BOARD_STEPS[name][index]
+        if not occupied & BIT[target]
+    )
+
+
+def _is_clear(name, source, dest, occupied):
+    if occupied & BIT[dest]:
+        return False
+    if name not in SLIDER_DIRECTIONS:
+        return True
+    return bool(attacks(source, occupied, SLIDER_DIRECTIONS[name]) & BIT[dest])
+
+
+def _empty_board_path(name, source, dest, occupied):
+    # Walks down the distance table, preferring steps that are free on the
+    # occupied board. Returns None if the walk runs into a blocker.
+    table = DISTANCES[name]
+    path = [source]
+    index = source
+    while index != dest:
+        remaining = table[index][dest] - 1
+        candidates = [
+            target
+            for target in EMPTY_BOARD_STEPS[name][index]
+            if table[target][dest] == remaining
+        ]
+        clear = [
+            target for target in candidates if _is_clear(name, index, target, occupied)
+        ]
+        if not clear:
+            return None
+        index = clear[0]
+        path.append(index)
+    return path
+
+
+def _search_path(name, source, dest, occupied):
+    parents = {source: None}
+    queue = deque([source])
+    while queue:
+        index = queue.popleft()
+        for target in _steps(name, index, occupied):
+            if target in parents:
+                continue
+            parents[target] = index
+            if target == dest:
+                path = [dest]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                return path[::-1]
+            queue.append(target)
+    return None
+
+
+def shortest_path(name, source, dest, occupied=0):
+    """
+    The shortest_path function finds one shortest sequence of moves for a figure from source to dest.
+    On an empty board the answer comes from the precomputed DISTANCES table. With blockers the empty-board
+    path is used when it is free, and a breadth-first search over the occupied squares only when it isn't.
+
+    :param name: Name of the figure, e.g. "knight"
+    :param source: Square index the figure starts on; it doesn't count as a blocker
+    :param dest: Square index to reach
+    :param occupied: Bitboard of the squares taken by other figures
+    :return: A list of square indexes from source to dest, or None if dest can't be reached
+    """
+    occupied &= ~BIT[source]
+    if DISTANCES[name][source][dest] is None or occupied & BIT[dest]:
+        return None
+    path = _empty_board_path(name, source, dest, occupied)
+    if path is None:
+        path = _search_path(name, source, dest, occupied)
+    return path
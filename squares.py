@@ -0,0 +1,80 @@
+from string import ascii_uppercase
+
+FILES = ascii_uppercase[:8]
+
+# Square index layout matches Board.mailbox: index = row * 8 + col, so A1 is 0,
+# H1 is 7 and H8 is 63.
+FIELDS = tuple(i + str(j) for j in range(1, 9) for i in FILES)
+FIELD_INDEX = {field: index for index, field in enumerate(FIELDS)}
+
+KING_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1))
+KNIGHT_OFFSETS = (
+    (-2, 1),
+    (-1, 2),
+    (1, 2),
+    (2, 1),
+    (-2, -1),
+    (-1, -2),
+    (1, -2),
+    (2, -1),
+)
+PAWN_OFFSETS = ((1, 0),)
+
+
+def leaper_targets(offsets):
+    """
+    The leaper_targets function builds a per-square table of the fields reachable with a single step.
+    The targets keep the order of the offsets, so the tables reproduce the order in which the figures
+    used to list their moves.
+
+    :param offsets: (row, col) steps the figure can make
+    :return: A tuple of 64 tuples with the target field names for every square index
+    """
+    table = []
+    for index in range(64):
+        row, col = divmod(index, 8)
+        targets = []
+        for d in offsets:
+            r = row + d[0]
+            c = col + d[1]
+            if -1 < r < 8 and 8 > c > -1:
+                targets.append(FIELDS[r * 8 + c])
+        table.append(tuple(targets))
+    return tuple(table)
+
+
+KING_MOVES = leaper_targets(KING_OFFSETS)
+KNIGHT_MOVES = leaper_targets(KNIGHT_OFFSETS)
+PAWN_MOVES = leaper_targets(PAWN_OFFSETS)
+
+QUEEN_DIRECTIONS = KING_OFFSETS
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (1, 1), (-1, 1), (1, -1))
+
+
+def ray_targets(directions):
+    """
+    The ray_targets function builds a per-square table of the fields a sliding figure could reach on an empty board.
+    Fields are ordered ray by ray, nearest first, which is the order the sliders have always listed their moves in.
+
+    :param directions: (row, col) steps of the rays the figure slides along
+    :return: A tuple of 64 tuples with the target field names for every square index
+    """
+    table = []
+    for index in range(64):
+        row, col = divmod(index, 8)
+        targets = []
+        for d in directions:
+            r = row + d[0]
+            c = col + d[1]
+            while -1 < r < 8 and 8 > c > -1:
+                targets.append(FIELDS[r * 8 + c])
+                r += d[0]
+                c += d[1]
+        table.append(tuple(targets))
+    return tuple(table)
+
+
+QUEEN_MOVES = ray_targets(QUEEN_DIRECTIONS)
+ROOK_MOVES = ray_targets(ROOK_DIRECTIONS)
+BISHOP_MOVES = ray_targets(BISHOP_DIRECTIONS)
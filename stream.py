@@ -0,0 +1,38 @@
+"""
+Replay move lists against a board and print a verdict per move as NDJSON.
+
+Input is read line by line. A line is either an NDJSON query like the batch
+endpoint takes ({"figure": "pawn", "currentField": "C5", "destField": "C6"}),
+a plain move such as "C5C6", "C5 C6" or "C5-C6", or {"fen": "..."} to start
+over from a new position. Valid moves are played on the board, so later
+lines see their effect. Every line gets one verdict:
+
+    {"line":1,"status":200,"result":[...]}
+
+    python stream.py --fen "8/3Q4/5P2/2PK4/2P1PR2/2PBP3/2N5/8" games.ndjson
+"""
+
+import argparse
+import fileinput
+import sys
+
+from core import load_position, ndjson_lines, replay_moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="input files, stdin if omitted")
+    parser.add_argument("--fen", default="8/8/8/8/8/8/8/8", help="starting position")
+    args = parser.parse_args()
+
+    try:
+        position = load_position(args.fen)
+    except ValueError as e:
+        parser.error(str(e))
+    with fileinput.input(args.files) as lines:
+        for chunk in ndjson_lines(replay_moves(lines, position)):
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
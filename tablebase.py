@@ -0,0 +1,102 @@
+"""
+Memory-mapped slider attack tablebase, written by build_tablebase.py.
+
+For every rook and bishop square the file holds the attack map of every
+occupancy of the squares that can block the slider, so an attack map is one
+multiply, one shift and one load from the mapping: no parsing, no copying,
+and worker processes that map the same file share its pages. Queens look
+up both tables.
+
+The file is an array of native-endian 64-bit words:
+
+    FILE_MAGIC, FORMAT_VERSION,
+    (mask, magic, shift, offset) for the 64 rook squares,
+    (mask, magic, shift, offset) for the 64 bishop squares,
+    attack tables
+
+The attack map of a square is word offset + (occupied & mask) * magic
+(mod 2**64) >> shift.
+"""
+
+import mmap
+import os
+
+from bitboard import FULL
+
+FILE_MAGIC = int.from_bytes(b"CHESSTB1", "little")
+FORMAT_VERSION = 1
+KINDS = ("rook", "bishop")
+HEADER_WORDS = 2
+PARAM_WORDS = 4
+TABLES_OFFSET = HEADER_WORDS + len(KINDS) * 64 * PARAM_WORDS
+
+
+class Tablebase:
+    """
+    Read-only view of a tablebase file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._words = memoryview(self._mmap).cast("Q")
+            words = self._words
+            if (
+                len(words) < TABLES_OFFSET
+                or words[0] != FILE_MAGIC
+                or words[1] != FORMAT_VERSION
+            ):
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} tablebase")
+            self._params = {}
+            for number, kind in enumerate(KINDS):
+                base = HEADER_WORDS + number * 64 * PARAM_WORDS
+                self._params[kind] = tuple(
+                    tuple(words[start : start + PARAM_WORDS])
+                    for start in range(base, base + 64 * PARAM_WORDS, PARAM_WORDS)
+                )
+                for _, _, shift, offset in self._params[kind]:
+                    if offset + (1 << (64 - shift)) > len(words):
+                        raise ValueError(f"{path} is truncated")
+        except BaseException:
+            self.close()
+            raise
+
+    def attacks(self, name, index, occupied):
+        """
+        The attacks function looks up the squares a slider sees from index, like bitboard.attacks.
+
+        :param self: Access the mapped tables
+        :param name: "queen", "rook" or "bishop"
+        :param index: Square index of the figure
+        :param occupied: Bitboard of all occupied squares
+        :return: A bitboard of the attacked squares, including the first blocker of every ray
+        """
+        if name == "queen":
+            return self._lookup("rook", index, occupied) | self._lookup(
+                "bishop", index, occupied
+            )
+        return self._lookup(name, index, occupied)
+
+    def _lookup(self, kind, index, occupied):
+        mask, magic, shift, offset = self._params[kind][index]
+        return self._words[offset + (((occupied & mask) * magic & FULL) >> shift)]
+
+    def close(self):
+        if getattr(self, "_words", None) is not None:
+            self._words.release()
+            self._words = None
+        self._mmap.close()
+
+
+def open_tablebase(path):
+    """
+    The open_tablebase function maps a tablebase file if there is one.
+
+    :param path: Path of the file
+    :return: A Tablebase, or None if the file doesn't exist
+    :raises ValueError: If the file isn't a tablebase of this format version
+    """
+    if not os.path.exists(path):
+        return None
+    return Tablebase(path)
@@ -0,0 +1,82 @@
+import os
+import random
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import FIGURE_CODES, FIGURES, decode_board
+from squares import FIELDS
+from vectorized import figure_codes, square_indexes, validate_moves
+
+EDGE_SQUARES = [
+    index for index in range(64) if index % 8 in (0, 7) or index // 8 in (0, 7)
+]
+
+
+def expected_moves(state, source):
+    position = decode_board(state)
+    piece = position.pieces[source]
+    return position, [
+        piece.validate_move(FIELDS[dest])[0] == "valid" for dest in range(64)
+    ]
+
+
+def vectorized_moves(code, source, occupied):
+    return validate_moves(
+        np.full(64, code), np.full(64, source), np.arange(64), np.uint64(occupied)
+    ).tolist()
+
+
+@pytest.mark.parametrize("figure", FIGURES, ids=lambda figure: figure.name)
+def test_agrees_with_validate_move_on_random_positions(figure):
+    rng = random.Random(figure.code)
+    for source in range(64):
+        for _ in range(5):
+            state = bytearray(64)
+            for square in rng.sample(range(64), rng.randint(0, 32)):
+                state[square] = rng.randint(1, len(FIGURES))
+            state[source] = figure.code
+            position, expected = expected_moves(state, source)
+            assert vectorized_moves(figure.code, source, position.occupied) == expected
+
+
+@pytest.mark.parametrize("figure", FIGURES, ids=lambda figure: figure.name)
+@pytest.mark.parametrize("source", EDGE_SQUARES, ids=lambda index: FIELDS[index])
+def test_agrees_with_validate_move_on_edge_squares(figure, source):
+    # Alone on the board, so every ray runs into the edge, and boxed in by a
+    # ring of pawns, so every ray is blocked right away.
+    state = bytearray(64)
+    state[source] = figure.code
+    position, expected = expected_moves(state, source)
+    assert vectorized_moves(figure.code, source, position.occupied) == expected
+
+    full = bytearray([FIGURE_CODES["pawn"]] * 64)
+    full[source] = figure.code
+    position, expected = expected_moves(full, source)
+    assert not any(expected)
+    assert vectorized_moves(figure.code, source, position.occupied) == expected
+
+
+def test_out_of_range_squares_are_invalid():
+    queen = FIGURE_CODES["queen"]
+    sources = [-1, 64, 1000, 27, 27, 27]
+    dests = [28, 28, 28, -1, 64, 1000]
+    assert not validate_moves(np.full(6, queen), sources, dests, 0).any()
+    assert square_indexes(["Z9", "A9", "a1", ""]).tolist() == [-1, -1, -1, -1]
+
+
+def test_unknown_figure_codes_are_invalid():
+    codes = [0, -1, len(FIGURES) + 1, 255]
+    assert not validate_moves(codes, np.full(4, 27), np.full(4, 28), 0).any()
+    assert figure_codes(["dragon", "Queen", ""]).tolist() == [0, 0, 0]
+
+
+def test_occupancy_per_move():
+    rook = FIGURE_CODES["rook"]
+    blocked = 1 << 1
+    result = validate_moves([rook, rook], [0, 0], [2, 2], [0, blocked])
+    assert result.tolist() == [True, False]
@@ -0,0 +1,207 @@
+"""
+Vectorized move validation for large batches of candidate moves.
+
+Needs NumPy. Moves are given as arrays of figure codes (see core.FIGURE_CODES),
+source and destination square indexes and occupancy bitboards, and are
+checked against the same precomputed target and between tables the figures
+use, in one pass over the arrays.
+
+    python vectorized.py --positions 200
+
+checks every figure, source and destination against Figure.validate_move on
+random positions, then reports the throughput.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from core import FIGURE_CODES, FIGURES, decode_board
+from bitboard import (
+    BETWEEN,
+    BISHOP_TARGETS,
+    BIT,
+    KING_TARGETS,
+    KNIGHT_TARGETS,
+    PAWN_TARGETS,
+    QUEEN_TARGETS,
+    ROOK_TARGETS,
+)
+from fen import parse_fen
+from squares import FIELDS, FIELD_INDEX
+
+_FIGURE_TARGETS = {
+    "king": KING_TARGETS,
+    "queen": QUEEN_TARGETS,
+    "rook": ROOK_TARGETS,
+    "bishop": BISHOP_TARGETS,
+    "knight": KNIGHT_TARGETS,
+    "pawn": PAWN_TARGETS,
+}
+
+# TARGETS[code, source] is the empty-board target bitboard of the figure with
+# that code; row 0 (no figure) is empty. Leapers only reach squares that are
+# adjacent or not aligned, so BETWEEN is empty for all of their targets and
+# the slider check applies to every figure.
+TARGETS = np.zeros((len(FIGURE_CODES) + 1, 64), dtype=np.uint64)
+for _name, _code in FIGURE_CODES.items():
+    TARGETS[_code] = _FIGURE_TARGETS[_name]
+BETWEEN_MASKS = np.array(BETWEEN, dtype=np.uint64)
+
+
+def validate_moves(figures, sources, dests, occupied):
+    """
+    The validate_moves function checks many moves at once, like calling validate_move for every one of them.
+    A move is valid if dest is an empty square the figure reaches from source with nothing in between.
+    Unknown figure codes and square indexes outside 0-63 are invalid.
+
+    :param figures: Array of figure codes, see core.FIGURE_CODES
+    :param sources: Array of source square indexes
+    :param dests: Array of destination square indexes
+    :param occupied: Occupancy bitboard of each move's position (including the moving figure), or one for all
+    :return: A boolean array, True where the move is valid
+    """
+    figures = np.asarray(figures, dtype=np.int64)
+    sources = np.asarray(sources, dtype=np.int64)
+    dests = np.asarray(dests, dtype=np.int64)
+    occupied = np.asarray(occupied, dtype=np.uint64)
+    known = (
+        (figures > 0)
+        & (figures < TARGETS.shape[0])
+        & (sources >= 0)
+        & (sources < 64)
+        & (dests >= 0)
+        & (dests < 64)
+    )
+    figures = np.where(known, figures, 0)
+    sources = np.where(known, sources, 0)
+    dests = np.where(known, dests, 0)
+    dest_bits = np.left_shift(np.uint64(1), dests.astype(np.uint64))
+    return (
+        known
+        & (TARGETS[figures, sources] & dest_bits != 0)
+        & (occupied & dest_bits == 0)
+        & (BETWEEN_MASKS[sources, dests] & occupied == 0)
+    )
+
+
+def figure_codes(names):
+    """
+    The figure_codes function converts figure names into codes for validate_moves.
+
+    :param names: Iterable of figure names; unknown names get code 0
+    :return: An int array of figure codes
+    """
+    return np.fromiter((FIGURE_CODES.get(name, 0) for name in names), dtype=np.int64)
+
+
+def square_indexes(fields):
+    """
+    The square_indexes function converts field names into square indexes for validate_moves.
+
+    :param fields: Iterable of field names; unknown fields get index -1
+    :return: An int array of square indexes
+    """
+    return np.fromiter((FIELD_INDEX.get(field, -1) for field in fields), dtype=np.int64)
+
+
+def occupancies(fens):
+    """
+    The occupancies function converts FEN strings into occupancy bitboards for validate_moves.
+    Every distinct FEN is parsed only once.
+
+    :param fens: Iterable of FEN strings
+    :return: A uint64 array of occupancy bitboards
+    :raises ValueError: If a FEN is malformed
+    """
+    parsed = {}
+    result = []
+    for fen in fens:
+        if fen not in parsed:
+            mask = 0
+            for _, square in parse_fen(fen):
+                mask |= BIT[square]
+            parsed[fen] = mask
+        result.append(parsed[fen])
+    return np.array(result, dtype=np.uint64)
+
+
+def verify(positions=100, seed=0):
+    """
+    The verify function checks validate_moves against Figure.validate_move.
+    For every figure type, source square and random position, all 64 destinations are compared.
+
+    :param positions: Number of random positions per figure type and source square
+    :param seed: Seed of the random positions
+    :return: A list of mismatching (figure, source field, dest field, occupied) tuples, empty if all agree
+    """
+    rng = random.Random(seed)
+    mismatches = []
+    for figure in FIGURES:
+        code = FIGURE_CODES[figure.name]
+        for source in range(64):
+            for _ in range(positions):
+                state = bytearray(64)
+                for square in rng.sample(range(64), rng.randint(0, 32)):
+                    state[square] = FIGURE_CODES["pawn"]
+                state[source] = code
+                position = decode_board(state)
+                piece = position.pieces[source]
+                expected = [
+                    piece.validate_move(FIELDS[dest])[0] == "valid"
+                    for dest in range(64)
+                ]
+                got = validate_moves(
+                    np.full(64, code),
+                    np.full(64, source),
+                    np.arange(64),
+                    np.uint64(position.occupied),
+                )
+                for dest in range(64):
+                    if bool(got[dest]) != expected[dest]:
+                        mismatches.append(
+                            (
+                                figure.name,
+                                FIELDS[source],
+                                FIELDS[dest],
+                                position.occupied,
+                            )
+                        )
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--moves", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches = verify(args.positions, args.seed)
+    for mismatch in mismatches[:20]:
+        print("mismatch", *mismatch)
+    if mismatches:
+        sys.exit(f"{len(mismatches)} moves disagree with Figure.validate_move")
+    print("validate_moves agrees with Figure.validate_move")
+
+    gen = np.random.default_rng(args.seed)
+    figures = gen.integers(1, len(FIGURE_CODES) + 1, args.moves)
+    sources = gen.integers(0, 64, args.moves)
+    dests = gen.integers(0, 64, args.moves)
+    occupied = gen.integers(
+        0, np.iinfo(np.uint64).max, args.moves, dtype=np.uint64, endpoint=True
+    )
+    start = time.perf_counter()
+    valid = validate_moves(figures, sources, dests, occupied)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.moves} moves in {elapsed:.3f}s ({args.moves / elapsed:.0f} moves/s), "
+        f"{int(valid.sum())} valid"
+    )
+
+
+if __name__ == "__main__":
+    main()